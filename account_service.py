@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from kivy.clock import Clock
+import passwords
+import settings
+
+
+class AccountService:
+    """
+    Inicio de sesión y registro con contraseña fuera del hilo de la interfaz.
+
+    La derivación scrypt y el acceso a la base de datos corren en un pool
+    de hilos limitado a `max_workers` derivaciones simultáneas (hashlib
+    libera el GIL), lo que acota CPU y memoria. El resultado se entrega
+    con un callback en el hilo de UI.
+    """
+
+    def __init__(self, users, max_workers=None):
+        """
+        Args:
+            users: UserRepository compartido
+            max_workers: Derivaciones simultáneas; por defecto settings.PASSWORD_MAX_CONCURRENCY
+        """
+        self.users = users
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.PASSWORD_MAX_CONCURRENCY,
+            thread_name_prefix='AccountService')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self):
+        """Indica si hay operaciones en curso"""
+        return self._pending > 0
+
+    def _submit(self, work, callback, *args):
+        """Ejecuta `work(*args)` en el pool y entrega (resultado, error) en el hilo de UI"""
+        with self._lock:
+            self._pending += 1
+
+        def run():
+            try:
+                result, error = work(*args), None
+            except Exception as e:
+                print(f"Error en la operación de cuenta: {str(e)}")
+                result, error = None, e
+            with self._lock:
+                self._pending -= 1
+            Clock.schedule_once(lambda dt: callback(result, error))
+
+        return self._executor.submit(run)
+
+    def _login(self, username, password):
+        user = self.users.get_by_username(username)
+        if user is None:
+            return passwords.dummy_verify(password) or None
+        if not passwords.verify_password(password, user['password']):
+            return None
+        if passwords.needs_rehash(user['password']):
+            # Pasar a scrypt con los parámetros configurados (también desde
+            # los formatos anteriores)
+            self.users.set_password(user['id'], passwords.hash_password(password))
+        return user
+
+    def _register(self, username, password):
+        return self.users.create_user(username, passwords.hash_password(password))
+
+    def login(self, username, password, callback):
+        """
+        Verifica credenciales en segundo plano
+        Args:
+            callback: (usuario o None, error) en el hilo de UI
+        """
+        return self._submit(self._login, callback, username, password)
+
+    def register(self, username, password, callback):
+        """
+        Crea un usuario en segundo plano
+        Args:
+            callback: (ID del usuario o None si ya existe, error) en el hilo de UI
+        """
+        return self._submit(self._register, callback, username, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -1,10 +1,20 @@
 import cv2
 import os
+import threading
 import numpy as np
 from kivy.graphics.texture import Texture
 from kivy.clock import Clock
 from kivy.uix.popup import Popup
 from kivy.uix.label import Label
+from camera_stream import CameraStream, open_camera
+import train_faces
+from sample_store import SampleStore, normalize_face
+from enrollment import EnrollmentJob
+from lbph_matcher import LBPHMatcher
+import model_store
+from face_tracker import FaceTracker
+from face_detection import AdaptiveScale, create_detector
+import metrics
 
 class FaceRecognition:
     def __init__(self):
@@ -14,164 +24,348 @@ class FaceRecognition:
         self._initialize_recognizer()
         self._initialize_camera()
         self.is_training = False
+        self.stream = None
+        self._sync_sequence = 0
+        self.tracker = None
+        self._texture = None
+        self._texture_sequence = None
+        self.texture_stats = {'allocations': 0, 'blits': 0, 'skipped': 0, 'copies': 0}
 
     def _initialize_directories(self):
         """Crea los directorios necesarios si no existen"""
         os.makedirs('models', exist_ok=True)
         os.makedirs('data', exist_ok=True)
+        self.sample_store = SampleStore('data')
 
     def _load_face_cascade(self):
-        """Carga el clasificador de rostros de Haar"""
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        if not os.path.exists(cascade_path):
-            raise Exception(f"Archivo clasificador no encontrado en: {cascade_path}")
-        
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
-        if self.face_cascade.empty():
-            raise Exception("No se pudo cargar el clasificador de rostros")
+        """Carga el detector de rostros configurado (Haar por defecto)"""
+        self.detector = create_detector()
+        # Escala adaptativa propia del flujo de la cámara
+        self.detection_scale = AdaptiveScale(self.detector.config)
 
     def _initialize_recognizer(self):
-        """Inicializa el reconocedor LBPH"""
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-        self.model_path = 'models/recognizer.yml'
+        """
+        Inicializa el reconocedor LBPH cargando el modelo binario mapeado
+        en memoria. Un modelo YAML de OpenCV anterior no se lee: se
+        reconstruye con train_faces.py desde las muestras guardadas.
+        """
+        self.model_bin_path = model_store.MODEL_BIN_PATH
         self.model_loaded = False
+        self.model_lock = threading.Lock()
+        self.matcher = None
+        self.model_watcher = None
         
         # Intentar cargar modelo existente
-        if os.path.exists(self.model_path) and os.path.getsize(self.model_path) > 0:
-            try:
-                self.recognizer.read(self.model_path)
+        try:
+            if os.path.exists(self.model_bin_path):
+                self.matcher = model_store.load_model(self.model_bin_path)
                 self.model_loaded = True
                 print("Modelo cargado exitosamente")
-            except Exception as e:
-                print(f"Error cargando modelo: {str(e)}")
-                self.model_loaded = False
+        except Exception as e:
+            print(f"Error cargando modelo: {str(e)}")
+            self.model_loaded = False
+
+    def _save_matcher(self, matcher):
+        """Guarda el modelo binario de forma atómica sin disparar la recarga propia"""
+        signature = model_store.save_model(matcher, self.model_bin_path)
+        if self.model_watcher is not None:
+            self.model_watcher.signature = signature
+
+    def reload_model(self, path=None):
+        """
+        Sustituye en caliente el modelo en memoria por el del archivo binario
+        Returns:
+            bool: True si se cargó el modelo
+        """
+        try:
+            matcher = model_store.load_model(path or self.model_bin_path)
+        except Exception as e:
+            print(f"Error recargando modelo: {str(e)}")
+            return False
+        with self.model_lock:
+            self.matcher = matcher
+            self.model_loaded = True
+        print(f"Modelo recargado con {len(matcher)} muestras")
+        return True
+
+    def start_model_watcher(self, interval=1.0):
+        """Recarga el modelo automáticamente cuando un entrenamiento lo reemplaza"""
+        if self.model_watcher is None:
+            self.model_watcher = model_store.ModelWatcher(
+                self.model_bin_path, self.reload_model, interval)
+            self.model_watcher.start()
+
+    def stop_model_watcher(self):
+        """Detiene la vigilancia del archivo del modelo"""
+        if self.model_watcher is not None:
+            self.model_watcher.stop()
+            self.model_watcher = None
+
+    def predict(self, face, user_id=None):
+        """
+        Reconoce un recorte de rostro en escala de grises
+        Args:
+            face: Imagen del rostro
+            user_id: Si se indica, verificación 1:1 solo contra ese usuario
+        Returns:
+            tuple: (label, confidence); menor confidence es mejor coincidencia
+        """
+        # Mismo tamaño que las muestras registradas: coste uniforme por rostro
+        face = normalize_face(face)
+        metrics.count('predictions')
+        with metrics.timed('predict'), self.model_lock:
+            if self.matcher is None:
+                raise Exception("No hay un modelo cargado")
+            if user_id is not None:
+                return user_id, self.matcher.verify(face, user_id)
+            return self.matcher.predict(face)
 
     def _initialize_camera(self):
-        """Inicializa la cámara con múltiples intentos"""
-        for i in range(3):  # Probar hasta 3 cámaras diferentes
-            self.capture = cv2.VideoCapture(i)
-            if self.capture.isOpened():
-                # Configurar resolución óptima
-                self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                return
-        raise Exception("No se pudo abrir ninguna cámara disponible")
-
-    def capture_face_samples(self, user_id, samples=20):
-        """
-        Captura muestras faciales para un usuario específico
+        """Inicializa la cámara probando primero el último dispositivo que funcionó"""
+        self.capture, self.camera_info = open_camera()
+
+    def start_stream(self, buffer_size=3):
+        """
+        Activa el modo de captura en segundo plano: un hilo dedicado lee
+        la cámara y los consumidores toman el último frame sin bloquear
+        """
+        if self.stream is None:
+            self.stream = CameraStream(self.capture, buffer_size)
+        self.stream.start()
+
+    def stop_stream(self):
+        """Detiene el hilo de captura en segundo plano"""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+
+    def read_latest(self):
+        """
+        Obtiene el frame más reciente de la cámara
+        Returns:
+            tuple: (secuencia, frame) o (secuencia, None) si no hay frame
+        """
+        if self.stream is not None:
+            return self.stream.latest()
+
+        # Sin hilo de captura se lee de forma síncrona
+        ret, frame = self.capture.read()
+        if not ret:
+            return self._sync_sequence, None
+        self._sync_sequence += 1
+        return self._sync_sequence, frame
+
+    def next_frame(self, last_seq, timeout=1.0):
+        """
+        Espera un frame más nuevo que `last_seq` (solo fuera del hilo de UI)
+        Args:
+            last_seq: Secuencia del último frame procesado (0 al empezar)
+            timeout: Segundos máximos de espera con el hilo de captura activo
+        Returns:
+            tuple: (secuencia, frame); frame es None si no llegó ninguno
+        """
+        if self.stream is not None:
+            return self.stream.wait_newer(last_seq, timeout)
+        return self.read_latest()
+
+    def stream_stats(self):
+        """
+        Devuelve los contadores del hilo de captura (frames perdidos, retraso,
+        tiempo de read() e intervalo entre frames) y el tiempo de apertura
+        """
+        stats = {'camera_open_ms': self.camera_info['open_ms']}
+        if self.stream is not None:
+            stats.update(self.stream.stats())
+        return stats
+
+    def capture_face_samples(self, user_id, samples=20, timeout=None):
+        """
+        Captura muestras faciales para un usuario específico. Bloquea hasta
+        terminar; la interfaz usa EnrollmentJob.start() en su lugar. Las
+        muestras se guardan en self.sample_store (ya no como
+        data/user_<id>/N.jpg) y sustituyen a las de un registro anterior.
         Args:
             user_id: ID del usuario
             samples: Número de muestras a capturar
+            timeout: Segundos máximos de captura
         Returns:
-            bool: True si se capturaron muestras exitosamente
+            bool: True si se capturaron y guardaron todas las muestras; si
+                  la captura no termina no queda ninguna muestra nueva
         """
-        samples_path = f'data/user_{user_id}'
-        os.makedirs(samples_path, exist_ok=True)
-        
-        count = 0
-        while count < samples:
-            ret, frame = self.capture.read()
-            if not ret:
-                print("Error: No se pudo capturar frame de la cámara")
-                continue
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-            
-            if len(faces) == 0:
-                print("Advertencia: No se detectaron rostros en el frame")
-                continue
-            
-            # Tomar solo el primer rostro detectado
-            (x, y, w, h) = faces[0]
-            
-            # Validar región de interés
-            if w <= 20 or h <= 20:  # Tamaño mínimo del rostro
-                continue
-            
-            try:
-                face_roi = gray[y:y+h, x:x+w]
-                
-                # Guardar la imagen del rostro
-                img_path = os.path.join(samples_path, f"{count}.jpg")
-                if not cv2.imwrite(img_path, face_roi):
-                    raise Exception(f"No se pudo guardar la imagen {img_path}")
-                
-                count += 1
-                print(f"Muestra {count}/{samples} capturada")
-                
-                # Mostrar feedback visual
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.putText(frame, f"Muestras: {count}/{samples}", (10, 30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                
-            except Exception as e:
-                print(f"Error procesando rostro: {str(e)}")
-                continue
-        
-        return count > 0  # Retorna True si se capturó al menos una muestra
+        return EnrollmentJob(self, user_id, samples, timeout).run()
 
-    def detect_faces(self, frame):
+    def analyze_frame(self, frame, user_id=None):
         """
-        Detecta y reconoce rostros en un frame
+        Detecta y reconoce rostros en un frame sin modificarlo. Es seguro
+        llamarlo desde un hilo de trabajo.
         Args:
             frame: Imagen donde detectar rostros
+            user_id: Si se indica, solo se verifica contra ese usuario (1:1)
         Returns:
-            int or None: ID del rostro reconocido o None si no se reconoce
+            dict: 'faces' con tuplas (x, y, w, h, label, confidence),
+                  'label' con el ID reconocido o None y 'predicted' si en
+                  este frame se ejecutó el reconocimiento
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray, 
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
+        with metrics.timed('cvt_color'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.tracker is not None:
+            return self._analyze_tracked(gray, user_id)
         
+        faces = self._detect(gray)
+        
+        results = []
         for (x, y, w, h) in faces:
             roi = gray[y:y+h, x:x+w]
+            label, confidence = None, None
             
             if self.model_loaded:
                 try:
-                    label, confidence = self.recognizer.predict(roi)
+                    label, confidence = self.predict(roi, user_id)
                     if confidence < 85:
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                        cv2.putText(frame, f'Usuario: {label}', (x, y-10),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                        return label
-                    
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 255), 2)
-                    cv2.putText(frame, 'Desconocido', (x, y-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+                        results.append((x, y, w, h, label, confidence))
+                        return {'faces': results, 'label': label, 'predicted': True}
                     
                 except Exception as e:
                     print(f"Error en reconocimiento: {str(e)}")
                     self.model_loaded = False
+                    label, confidence = None, None
             
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
+            results.append((x, y, w, h, label, confidence))
+        
+        return {'faces': results, 'label': None,
+                'predicted': any(face[5] is not None for face in results)}
+
+    def _detect(self, gray):
+        """Detecta rostros sobre una copia reducida; las cajas vuelven a resolución completa"""
+        metrics.count('detections')
+        with metrics.timed('detect'):
+            return self.detector.detect(gray, adaptive=self.detection_scale)
+
+    def enable_tracking(self, full_interval=10, roi_margin=0.5, reuse_recognition=True):
+        """
+        Activa el modo de seguimiento: la detección completa solo se ejecuta
+        cada `full_interval` frames o al perder el rostro, y el
+        reconocimiento se reutiliza mientras su confianza no se degrade
+        (salvo con reuse_recognition=False)
+        """
+        self.detection_scale = AdaptiveScale(self.detector.config)
+        self.tracker = FaceTracker(self._detect, full_interval, roi_margin,
+                                   reuse_recognition=reuse_recognition)
+
+    def disable_tracking(self):
+        """Vuelve a detectar sobre el frame completo en cada llamada"""
+        self.detection_scale = AdaptiveScale(self.detector.config)
+        self.tracker = None
+
+    def _analyze_tracked(self, gray, user_id):
+        """analyze_frame en modo seguimiento: un único rostro seguido"""
+        tracker = self.tracker
+        box = tracker.update(gray)
+        if box is None:
+            return {'faces': [], 'label': None, 'predicted': False}
         
-        return None
+        x, y, w, h = box
+        predicted = False
+        if self.model_loaded and tracker.needs_recognition():
+            predicted = True
+            try:
+                label, confidence = self.predict(gray[y:y+h, x:x+w], user_id)
+                tracker.set_recognition(label, confidence)
+            except Exception as e:
+                print(f"Error en reconocimiento: {str(e)}")
+                self.model_loaded = False
+                tracker.set_recognition(None, None)
+        
+        label, confidence = tracker.label, tracker.confidence
+        recognized = confidence is not None and confidence < 85
+        return {'faces': [(x, y, w, h, label, confidence)],
+                'label': label if recognized else None,
+                'predicted': predicted}
+
+    def detection_stats(self):
+        """Devuelve las llamadas al detector por segundo del modo seguimiento"""
+        if self.tracker is None:
+            return {}
+        return self.tracker.stats()
+
+    def draw_faces(self, frame, faces):
+        """
+        Dibuja sobre el frame los rostros devueltos por analyze_frame
+        Args:
+            frame: Imagen donde dibujar
+            faces: Lista de tuplas (x, y, w, h, label, confidence)
+        """
+        for (x, y, w, h, label, confidence) in faces:
+            if confidence is not None and confidence < 85:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                cv2.putText(frame, f'Usuario: {label}', (x, y-10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+                continue
+            
+            if confidence is not None:
+                cv2.putText(frame, 'Desconocido', (x, y-10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
+
+    def detect_faces(self, frame):
+        """
+        Detecta y reconoce rostros en un frame
+        Args:
+            frame: Imagen donde detectar rostros
+        Returns:
+            int or None: ID del rostro reconocido o None si no se reconoce
+        """
+        result = self.analyze_frame(frame)
+        self.draw_faces(frame, result['faces'])
+        return result['label']
 
-    def frame_to_texture(self, frame):
+    def frame_to_texture(self, frame, sequence=None):
         """
-        Convierte un frame de OpenCV a textura Kivy
+        Convierte un frame de OpenCV a textura Kivy. La textura se crea una
+        sola vez por resolución y el buffer BGR se copia directamente; el
+        volteo vertical se hace con las coordenadas UV de la textura.
         Args:
             frame: Imagen a convertir
+            sequence: Secuencia del frame; si no cambió no se vuelve a copiar
         Returns:
             Texture: Textura para mostrar en Kivy
         """
         try:
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            buf = cv2.flip(frame_rgb, 0).tobytes()
-            texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='rgb')
-            texture.blit_buffer(buf, colorfmt='rgb', bufferfmt='ubyte')
-            return texture
+            size = (frame.shape[1], frame.shape[0])
+            if self._texture is None or tuple(self._texture.size) != size:
+                self._texture = Texture.create(size=size, colorfmt='bgr')
+                self._texture.flip_vertical()
+                self._texture_sequence = None
+                self.texture_stats['allocations'] += 1
+            elif sequence is not None and sequence == self._texture_sequence:
+                self.texture_stats['skipped'] += 1
+                return self._texture
+            
+            if not frame.flags['C_CONTIGUOUS']:
+                frame = np.ascontiguousarray(frame)
+                self.texture_stats['copies'] += 1
+            
+            with metrics.timed('frame_to_texture'):
+                self._texture.blit_buffer(frame.reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+            self._texture_sequence = sequence
+            self.texture_stats['blits'] += 1
+            return self._texture
         except Exception as e:
             print(f"Error convirtiendo frame a textura: {str(e)}")
             return None
 
+    def camera_open(self):
+        """Indica si la cámara está abierta"""
+        return getattr(self, 'capture', None) is not None and self.capture.isOpened()
+
+    def open_camera(self):
+        """Vuelve a abrir la cámara después de release_camera()"""
+        self.stop_stream()
+        self._initialize_camera()
+
     def release_camera(self):
         """Libera los recursos de la cámara"""
+        self.stop_stream()
         if hasattr(self, 'capture') and self.capture and self.capture.isOpened():
             self.capture.release()
             print("Cámara liberada correctamente")
@@ -186,12 +380,99 @@ class FaceRecognition:
             bool: True si el entrenamiento fue exitoso
         """
         try:
-            self.recognizer.train(faces, np.array(labels))
-            os.makedirs("models", exist_ok=True)
-            self.recognizer.save(self.model_path)
-            self.model_loaded = True
-            print(f"Modelo entrenado y guardado en {self.model_path}")
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.train(faces, np.array(labels))
+            matcher = LBPHMatcher.from_recognizer(recognizer)
+            self._save_matcher(matcher)
+            with self.model_lock:
+                self.matcher = matcher
+                self.model_loaded = True
+            print(f"Modelo entrenado y guardado en {self.model_bin_path}")
             return True
         except Exception as e:
             print(f"Error entrenando modelo: {str(e)}")
             return False
+
+    def load_user_samples(self, user_id):
+        """
+        Carga las muestras guardadas de un usuario desde el almacén
+        Args:
+            user_id: ID del usuario
+        Returns:
+            list: Imágenes en escala de grises
+        """
+        faces, _ = self.sample_store.samples(user_id)
+        return faces
+
+    def enroll_user(self, user_id, faces=None):
+        """
+        Agrega de forma incremental las muestras de un usuario al modelo
+        cargado sin reentrenar al resto: solo se calculan los histogramas
+        LBPH de sus muestras, que sustituyen a los de un registro anterior,
+        y el modelo binario se reescribe de forma atómica.
+        Args:
+            user_id: ID del usuario
+            faces: Muestras a agregar; si es None se leen de disco
+        Returns:
+            bool: True si el modelo se actualizó y se guardó
+        """
+        if faces is not None:
+            if not faces:
+                print(f"Error: No hay muestras para el usuario {user_id}")
+                return False
+            return self.enroll_users([user_id], {user_id: faces}) == [user_id]
+        return self.enroll_users([user_id]) == [user_id]
+
+    def enroll_users(self, user_ids, faces_by_user=None, on_progress=None):
+        """
+        Agrega varios usuarios al modelo en una sola pasada: se calculan
+        los histogramas de cada uno y el modelo binario se escribe una vez
+        Args:
+            user_ids: IDs de los usuarios
+            faces_by_user: dict opcional {user_id: muestras}; si falta se leen de disco
+            on_progress: Callback opcional (procesados, total)
+        Returns:
+            list: IDs agregados al modelo (vacía si no se pudo guardar)
+        """
+        try:
+            matcher = self.matcher if self.matcher is not None else LBPHMatcher.from_histograms([], [])
+            histograms_by_user = {}
+            enrolled = []
+            for i, user_id in enumerate(user_ids):
+                faces = (faces_by_user or {}).get(user_id)
+                if faces is None:
+                    faces = self.load_user_samples(user_id)
+                if not faces:
+                    print(f"Error: No hay muestras para el usuario {user_id}")
+                else:
+                    histograms_by_user[user_id] = [matcher.histogram(face) for face in faces]
+                    enrolled.append(user_id)
+                    print(f"Usuario {user_id} agregado al modelo con {len(faces)} muestras")
+                if on_progress:
+                    on_progress(i + 1, len(user_ids))
+
+            if not enrolled:
+                return []
+            # El modelo nuevo se escribe por bloques y se vuelve a mapear
+            matcher, signature = model_store.update_model(matcher, histograms_by_user, self.model_bin_path)
+            if self.model_watcher is not None:
+                self.model_watcher.signature = signature
+            with self.model_lock:
+                self.matcher = matcher
+                self.model_loaded = True
+            return enrolled
+        except Exception as e:
+            print(f"Error actualizando modelo: {str(e)}")
+            return []
+
+    def compact_model(self):
+        """
+        Reentrena el modelo completo desde las muestras en disco y lo
+        recarga. Es el paso explícito de compactación tras varios registros
+        incrementales.
+        Returns:
+            bool: True si el entrenamiento fue exitoso
+        """
+        if not train_faces.train_model():
+            return False
+        return self.reload_model()
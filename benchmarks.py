@@ -0,0 +1,409 @@
+"""
+Pruebas de rendimiento sin cámara ni ventana.
+
+Sustituye cv2.VideoCapture por una fuente que reproduce un vídeo, un
+directorio de imágenes o frames sintéticos a un ritmo fijo y mide los
+caminos críticos de FaceRecognition. El entrenamiento completo y
+detect_faces con reconocimiento se miden sobre conjuntos generados de
+cada tamaño. Los resultados se imprimen como tabla y se pueden
+guardar en JSON para compararlos entre commits:
+
+    python benchmarks.py --source synthetic --json antes.json
+    python benchmarks.py --source video.mp4 --compare antes.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+# Kivy sin ventana ni argumentos de línea de comandos
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+import cv2
+import numpy as np
+import settings
+import metrics
+from lbph_matcher import _synthetic_faces
+
+_VideoCapture = cv2.VideoCapture
+
+FRAME_SIZE = (640, 480)
+# Caja donde los frames sintéticos colocan el rostro
+SYNTHETIC_BOX = (220, 140, 200, 200)
+
+
+class FakeCapture:
+    """
+    Sustituto de cv2.VideoCapture que reproduce frames en bucle a `fps`
+    (0 para entregarlos sin espera)
+    """
+
+    def __init__(self, frames, fps=30.0):
+        self.frames = frames
+        self.fps = fps
+        self.position = 0
+        self.reads = 0
+        self._opened = True
+        self._next_time = time.monotonic()
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened or not self.frames:
+            return False, None
+        if self.fps:
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time, time.monotonic() - 1.0 / self.fps) + 1.0 / self.fps
+        frame = self.frames[self.position % len(self.frames)]
+        self.position += 1
+        self.reads += 1
+        # Copia, como hace el driver con cada frame nuevo
+        return True, frame.copy()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.frames[0].shape[1]) if self.frames else 0.0
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.frames[0].shape[0]) if self.frames else 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self._opened = False
+
+
+def synthetic_frames(count=30, seed=0):
+    """Frames BGR con un rostro sintético en SYNTHETIC_BOX"""
+    rng = np.random.default_rng(seed)
+    x, y, w, h = SYNTHETIC_BOX
+    faces = _synthetic_faces(count, rng, size=w)
+    frames = []
+    for face in faces:
+        frame = np.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 96, dtype=np.uint8)
+        frame[y:y+h, x:x+w] = face[:, :, None]
+        frames.append(frame)
+    return frames
+
+
+def load_frames(source, max_frames=300):
+    """
+    Carga los frames de una fuente
+    Args:
+        source: 'synthetic', un directorio de imágenes o un vídeo
+        max_frames: Máximo de frames a cargar
+    Returns:
+        list: Frames BGR
+    """
+    if source == 'synthetic':
+        return synthetic_frames(min(max_frames, 30))
+
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source))[:max_frames]:
+            img = cv2.imread(os.path.join(source, name))
+            if img is not None:
+                frames.append(img)
+    else:
+        capture = _VideoCapture(source)
+        while len(frames) < max_frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frames.append(frame)
+        capture.release()
+    if not frames:
+        raise Exception(f"No se pudieron leer frames de {source}")
+    return frames
+
+
+@contextlib.contextmanager
+def fake_camera(frames, fps=30.0):
+    """Sustituye cv2.VideoCapture mientras dura el bloque `with`"""
+    cv2.VideoCapture = lambda *args, **kwargs: FakeCapture(frames, fps)
+    try:
+        yield
+    finally:
+        cv2.VideoCapture = _VideoCapture
+
+
+@contextlib.contextmanager
+def workspace():
+    """Directorio de trabajo temporal para no tocar models/ ni data/ reales"""
+    previous = os.getcwd()
+    previous_cache = settings.CAMERA_CACHE_PATH
+    previous_db = settings.USERS_DB_PATH
+    path = tempfile.mkdtemp(prefix='face-bench-')
+    os.chdir(path)
+    settings.CAMERA_CACHE_PATH = os.path.join(path, 'models', 'camera.json')
+    settings.USERS_DB_PATH = os.path.join(path, 'models', 'users.db')
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+        settings.CAMERA_CACHE_PATH = previous_cache
+        settings.USERS_DB_PATH = previous_db
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class FixedBoxDetector:
+    """Detector que devuelve SYNTHETIC_BOX; para frames sintéticos, donde Haar no encuentra rostros"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def detect(self, gray, scale_factor=None, adaptive=None):
+        return [SYNTHETIC_BOX]
+
+
+class HeadlessTexture:
+    """Textura sin contexto GL: blit_buffer copia a memoria como lo haría la subida"""
+
+    def __init__(self, size):
+        self.size = size
+        self._buffer = np.empty(size[0] * size[1] * 3, dtype=np.uint8)
+
+    @classmethod
+    def create(cls, size, colorfmt='bgr'):
+        return cls(size)
+
+    def flip_vertical(self):
+        pass
+
+    def blit_buffer(self, buffer, colorfmt='bgr', bufferfmt='ubyte'):
+        np.copyto(self._buffer, buffer)
+
+
+def summarize(name, latencies_ms, items, seconds, **extra):
+    """Resume latencias en ms y rendimiento en elementos por segundo"""
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, (50, 95, 99)) if len(values) else (0.0, 0.0, 0.0)
+    result = {
+        'benchmark': name,
+        'items': items,
+        'seconds': seconds,
+        'throughput': items / seconds if seconds > 0 else 0.0,
+        'mean_ms': float(values.mean()) if len(values) else 0.0,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+    }
+    result.update(extra)
+    return result
+
+
+def _face_recognition(synthetic):
+    """Crea FaceRecognition con la textura sin GL y, para frames sintéticos, el detector fijo"""
+    import auth
+    auth.Texture = HeadlessTexture
+    fr = auth.FaceRecognition()
+    if synthetic:
+        fr.detector = FixedBoxDetector(fr.detector.config)
+    return fr
+
+
+def bench_detect_faces(fr, frames, **extra):
+    """detect_faces síncrono sobre cada frame (detección, reconocimiento y dibujo)"""
+    latencies = []
+    start = time.perf_counter()
+    for frame in frames:
+        t0 = time.perf_counter()
+        fr.detect_faces(frame.copy())
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    return summarize('detect_faces', latencies, len(frames), time.perf_counter() - start,
+                     unit='frames/s', **extra)
+
+
+def bench_frame_to_texture(fr, frames, repeats=3):
+    """frame_to_texture con frames nuevos en cada llamada"""
+    latencies = []
+    sequence = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for frame in frames:
+            sequence += 1
+            t0 = time.perf_counter()
+            fr.frame_to_texture(frame, sequence)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+    return summarize('frame_to_texture', latencies, len(latencies), time.perf_counter() - start,
+                     unit='frames/s')
+
+
+def bench_capture_face_samples(fr, samples=20, runs=3):
+    """Captura de registro completa contra el hilo de captura a su ritmo fijo"""
+    fr.start_stream()
+    latencies = []
+    accepted = 0
+    start = time.perf_counter()
+    try:
+        for run in range(runs):
+            t0 = time.perf_counter()
+            if fr.capture_face_samples(run + 1, samples, timeout=max(10.0, samples)):
+                # Las muestras se guardan en el almacén, no en data/user_<id>
+                faces, _ = fr.sample_store.samples(run + 1)
+                accepted += len(faces)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+    finally:
+        fr.stop_stream()
+    return summarize('capture_face_samples', latencies, accepted, time.perf_counter() - start,
+                     unit='samples/s', runs=runs, samples_per_run=samples)
+
+
+def _generate_dataset(users, samples_per_user, seed=0):
+    """Crea usuarios y muestras sintéticas en el directorio de trabajo actual"""
+    from sample_store import SampleStore
+    from user_repository import UserRepository
+
+    rng = np.random.default_rng(seed)
+    repository = UserRepository()
+    store = SampleStore('data')
+    for i in range(users):
+        user_id = repository.create_user(f'user{i}', '')
+        store.append(user_id, _synthetic_faces(samples_per_user, rng))
+    repository.close()
+
+
+def bench_datasets(frames, synthetic, fps=30.0, user_counts=(10, 100, 1000, 10000),
+                   samples_per_user=1, skip=()):
+    """
+    Por cada tamaño genera el conjunto, mide train_faces.train_model
+    completo (carga, entrenamiento y guardado) y, con el modelo resultante
+    cargado, mide detect_faces con el reconocimiento activo
+    Returns:
+        list: Resultados de summarize() con el número de usuarios
+    """
+    import train_faces
+
+    results = []
+    for users in user_counts:
+        with workspace():
+            _generate_dataset(users, samples_per_user)
+            start = time.perf_counter()
+            success = train_faces.train_model()
+            seconds = time.perf_counter() - start
+            if not success:
+                raise Exception(f"Falló el entrenamiento con {users} usuarios")
+            samples = users * samples_per_user
+            if 'train_model' not in skip:
+                results.append(summarize('train_model', [seconds * 1000.0], samples, seconds,
+                                         unit='samples/s', users=users,
+                                         samples_per_user=samples_per_user))
+
+            if 'detect_faces' not in skip:
+                with fake_camera(frames, fps):
+                    fr = _face_recognition(synthetic)
+                    try:
+                        if not fr.model_loaded:
+                            raise Exception(f"No se cargó el modelo de {users} usuarios")
+                        results.append(bench_detect_faces(fr, frames, users=users,
+                                                          samples_per_user=samples_per_user))
+                    finally:
+                        fr.release_camera()
+    return results
+
+
+def print_table(results):
+    """Imprime los resultados como tabla"""
+    print(f"{'benchmark':<22} {'tamaño':>8} {'rendimiento':>16} {'media':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for r in results:
+        size = r.get('users', r['items'])
+        rate = f"{r['throughput']:.1f} {r.get('unit', '')}"
+        print(f"{r['benchmark']:<22} {size:>8} {rate:>16} {r['mean_ms']:>8.2f}ms "
+              f"{r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms")
+
+
+def _key(result):
+    return (result['benchmark'], result.get('users'))
+
+
+def compare(results, baseline_path):
+    """Imprime la variación de p50 y rendimiento respecto a un JSON anterior"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {_key(r): r for r in baseline['results']}
+    print(f"\nComparación con {baseline.get('commit') or baseline_path}")
+    print(f"{'benchmark':<22} {'tamaño':>8} {'p50':>10} {'rendimiento':>12}")
+    for r in results:
+        old = previous.get(_key(r))
+        if old is None:
+            continue
+        p50 = r['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('nan')
+        rate = r['throughput'] / old['throughput'] if old['throughput'] else float('nan')
+        print(f"{r['benchmark']:<22} {r.get('users', r['items']):>8} {p50:>9.2f}x {rate:>11.2f}x")
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(source='synthetic', fps=30.0, max_frames=300, samples=20, user_counts=(10, 100, 1000, 10000),
+        samples_per_user=1, skip=()):
+    """
+    Ejecuta todas las pruebas
+    Returns:
+        list: Resultados de summarize()
+    """
+    frames = load_frames(source, max_frames)
+    synthetic = source == 'synthetic'
+    results = []
+    metrics.registry.enabled = True
+
+    # Caminos que no dependen del modelo
+    if 'frame_to_texture' not in skip or 'capture_face_samples' not in skip:
+        with workspace(), fake_camera(frames, fps):
+            fr = _face_recognition(synthetic)
+            try:
+                if 'frame_to_texture' not in skip:
+                    results.append(bench_frame_to_texture(fr, frames))
+                if 'capture_face_samples' not in skip:
+                    results.append(bench_capture_face_samples(fr, samples))
+            finally:
+                fr.release_camera()
+
+    # Entrenamiento y reconocimiento sobre cada tamaño de conjunto
+    if 'train_model' not in skip or 'detect_faces' not in skip:
+        results.extend(bench_datasets(frames, synthetic, fps, user_counts, samples_per_user, skip))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pruebas de rendimiento con cámara simulada')
+    parser.add_argument('--source', default='synthetic',
+                        help="'synthetic', directorio de imágenes o archivo de vídeo")
+    parser.add_argument('--fps', type=float, default=30.0, help='Ritmo de la cámara simulada (0 sin límite)')
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('--samples', type=int, default=20, help='Muestras por captura de registro')
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='Tamaños del conjunto generado para train_model y detect_faces')
+    parser.add_argument('--samples-per-user', type=int, default=1,
+                        help='Muestras por usuario generado (10k usuarios y 1 muestra ocupan ~650 MB)')
+    parser.add_argument('--skip', nargs='*', default=[],
+                        choices=['detect_faces', 'frame_to_texture', 'capture_face_samples', 'train_model'])
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    results = run(args.source, args.fps, args.max_frames, args.samples, args.users,
+                  args.samples_per_user, set(args.skip))
+    print_table(results)
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': _commit(), 'source': args.source, 'time': time.time(),
+                       'results': results, 'stages': metrics.registry.snapshot()['stages']}, f, indent=2)
@@ -0,0 +1,270 @@
+"""
+Registro masivo y reconocimiento por lotes desde la línea de comandos.
+
+    python bulk_faces.py enroll fotos/        # fotos/<usuario>/*.jpg|*.mp4
+    python bulk_faces.py recognize archivo/   # archivo/<usuario>/*.jpg o imágenes sueltas
+
+La detección y el recorte se reparten en un pool de procesos. El
+registro escribe las muestras de cada usuario de una vez y entrena el
+modelo una sola vez al final; las instancias en ejecución lo recargan
+en caliente.
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+import settings
+import model_store
+import train_faces
+from face_detection import create_detector
+from sample_store import SampleStore, SampleQualityGate, normalize_face
+from user_repository import UserRepository
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm'}
+
+# Contraseña que no corresponde a ninguna derivación: los usuarios
+# creados en bloque solo pueden entrar con el rostro hasta que la cambien
+UNUSABLE_PASSWORD = '!'
+
+# Estado de cada proceso del pool, creado una vez por el inicializador
+_detector = None
+_matcher = None
+
+
+def _init_worker(model_path=None):
+    global _detector, _matcher
+    _detector = create_detector()
+    if model_path is not None:
+        _matcher = model_store.load_model(model_path)
+
+
+def _largest_face(gray, scale_factor=None):
+    """Recorte normalizado del rostro más grande o None"""
+    faces = _detector.detect(gray, scale_factor=scale_factor)
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    return normalize_face(gray[y:y+h, x:x+w])
+
+
+def _frames(path, frame_step):
+    """Imágenes en escala de grises de una foto o de cada `frame_step` frames de un vídeo"""
+    if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            yield img
+        return
+    capture = cv2.VideoCapture(path)
+    index = 0
+    while True:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        if index % frame_step == 0:
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        index += 1
+    capture.release()
+
+
+def _extract_crops(task):
+    """Tarea del pool: recortes de rostro de un archivo"""
+    username, path, frame_step = task
+    crops = []
+    try:
+        for gray in _frames(path, frame_step):
+            face = _largest_face(gray, _detector.config.enrollment_scale_factor)
+            if face is not None:
+                crops.append(face)
+    except Exception as e:
+        print(f"Error procesando {path}: {str(e)}")
+    return username, path, crops
+
+
+def _recognize_file(task):
+    """Tarea del pool: (etiqueta esperada, ruta, etiqueta, distancia) de una imagen"""
+    expected, path = task
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return expected, path, None, None
+    face = _largest_face(img)
+    if face is None:
+        return expected, path, None, None
+    label, distance = _matcher.predict(face)
+    return expected, path, int(label), float(distance)
+
+
+def _media_files(directory, extensions):
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if os.path.splitext(name)[1].lower() in extensions]
+
+
+def collect_users(root):
+    """
+    Args:
+        root: Directorio con una carpeta por usuario
+    Returns:
+        dict: {usuario: lista de fotos y vídeos}
+    """
+    users = {}
+    for entry in sorted(os.listdir(root)):
+        user_dir = os.path.join(root, entry)
+        if os.path.isdir(user_dir):
+            files = _media_files(user_dir, IMAGE_EXTENSIONS | VIDEO_EXTENSIONS)
+            if files:
+                users[entry] = files
+    return users
+
+
+def enroll(root, workers=None, frame_step=5, max_samples=20):
+    """
+    Registra en bloque a los usuarios de `root` y entrena el modelo una vez
+    Args:
+        root: Directorio con una carpeta de fotos o vídeos por usuario
+        workers: Procesos del pool; por defecto uno por CPU
+        frame_step: En los vídeos se procesa uno de cada `frame_step` frames
+        max_samples: Muestras máximas por usuario
+    Returns:
+        bool: True si el entrenamiento fue exitoso
+    """
+    users = collect_users(root)
+    if not users:
+        print(f"Error: No se encontraron carpetas de usuario en {root}")
+        return False
+
+    tasks = [(username, path, frame_step) for username, files in users.items() for path in files]
+    start = time.perf_counter()
+    crops = {username: [] for username in users}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for username, path, faces in pool.map(_extract_crops, tasks, chunksize=4):
+            crops[username].extend(faces)
+    extract_seconds = time.perf_counter() - start
+    total_crops = sum(len(faces) for faces in crops.values())
+    print(f"{len(tasks)} archivos procesados en {extract_seconds:.2f} s "
+          f"({len(tasks) / max(extract_seconds, 1e-9):.1f} archivos/s, {total_crops} rostros)")
+
+    repository = UserRepository()
+    store = SampleStore('data')
+    enrolled = []
+    try:
+        for username, faces in crops.items():
+            gate = SampleQualityGate()
+            accepted = [face for face in (gate.check(f) for f in faces) if face is not None][:max_samples]
+            if not accepted:
+                print(f"Advertencia: {username} sin muestras válidas "
+                      f"({gate.rejected_blurry} borrosas, {gate.rejected_duplicate} repetidas)")
+                continue
+            user_id = repository.get_user_id(username)
+            if user_id is None:
+                user_id = repository.create_user(username, UNUSABLE_PASSWORD)
+            # Una sola escritura por usuario que sustituye su registro anterior
+            store.replace_user(user_id, accepted)
+            enrolled.append(user_id)
+
+        if not enrolled:
+            return False
+        if not train_faces.train_model():
+            return False
+        for user_id in enrolled:
+            repository.set_face_id(user_id, user_id)
+    finally:
+        repository.close()
+
+    print(f"{len(enrolled)} usuarios registrados en {time.perf_counter() - start:.2f} s")
+    return True
+
+
+def recognize(root, workers=None, model_path=None, threshold=None, report=None):
+    """
+    Reconoce por lotes las imágenes de `root` con el modelo actual. Si hay
+    carpetas por usuario se calcula la precisión contra el nombre de la carpeta.
+    Args:
+        root: Directorio de imágenes o de carpetas por usuario
+        workers: Procesos del pool; por defecto uno por CPU
+        model_path: Modelo binario; por defecto model_store.MODEL_BIN_PATH
+        threshold: Distancia máxima para aceptar; por defecto settings.RECOGNITION_THRESHOLD
+        report: Ruta opcional de un CSV con el resultado de cada imagen
+    Returns:
+        dict: Imágenes, rendimiento, precisión y tasas de rechazo y falsa aceptación
+    """
+    model_path = model_path or model_store.MODEL_BIN_PATH
+    threshold = settings.RECOGNITION_THRESHOLD if threshold is None else threshold
+
+    repository = UserRepository()
+    try:
+        tasks = []
+        for username, files in collect_users(root).items():
+            user_id = repository.get_user_id(username)
+            expected = user_id if user_id is not None else -1
+            tasks.extend((expected, path) for path in files
+                         if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+        tasks.extend((None, path) for path in _media_files(root, IMAGE_EXTENSIONS))
+    finally:
+        repository.close()
+    if not tasks:
+        print(f"Error: No se encontraron imágenes en {root}")
+        return None
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path,)) as pool:
+        results = list(pool.map(_recognize_file, tasks, chunksize=16))
+    seconds = time.perf_counter() - start
+
+    labeled = [r for r in results if r[0] is not None]
+    no_face = sum(1 for r in results if r[2] is None)
+    accepted = [r for r in labeled if r[3] is not None and r[3] < threshold]
+    correct = sum(1 for r in accepted if r[2] == r[0])
+    distances = np.array([r[3] for r in results if r[3] is not None])
+    summary = {
+        'images': len(results),
+        'seconds': seconds,
+        'images_per_second': len(results) / seconds if seconds > 0 else 0.0,
+        'no_face': no_face,
+        'labeled': len(labeled),
+        'accuracy': correct / len(labeled) if labeled else None,
+        'false_accept_rate': (len(accepted) - correct) / len(labeled) if labeled else None,
+        'reject_rate': (len(labeled) - len(accepted)) / len(labeled) if labeled else None,
+        'median_distance': float(np.median(distances)) if len(distances) else None,
+    }
+
+    print(f"{summary['images']} imágenes en {seconds:.2f} s ({summary['images_per_second']:.1f} imágenes/s), "
+          f"{no_face} sin rostro")
+    if labeled:
+        print(f"Precisión {summary['accuracy']:.1%}, falsa aceptación {summary['false_accept_rate']:.1%}, "
+              f"rechazo {summary['reject_rate']:.1%} (umbral {threshold})")
+
+    if report:
+        with open(report, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path', 'expected', 'label', 'distance', 'accepted'])
+            for expected, path, label, distance in results:
+                writer.writerow([path, expected, label, distance,
+                                 distance is not None and distance < threshold])
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Registro masivo y reconocimiento por lotes')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos del pool (por defecto uno por CPU)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enroll_parser = commands.add_parser('enroll', help='Registrar usuarios desde carpetas de fotos o vídeos')
+    enroll_parser.add_argument('root', help='Directorio con una carpeta por usuario')
+    enroll_parser.add_argument('--frame-step', type=int, default=5, help='Procesar uno de cada N frames de vídeo')
+    enroll_parser.add_argument('--max-samples', type=int, default=20, help='Muestras máximas por usuario')
+
+    recognize_parser = commands.add_parser('recognize', help='Reconocer imágenes con el modelo actual')
+    recognize_parser.add_argument('root', help='Directorio de imágenes o de carpetas por usuario')
+    recognize_parser.add_argument('--model', default=None, help='Modelo binario a usar')
+    recognize_parser.add_argument('--threshold', type=float, default=None)
+    recognize_parser.add_argument('--report', help='CSV con el resultado de cada imagen')
+
+    args = parser.parse_args()
+    if args.command == 'enroll':
+        enroll(args.root, args.workers, args.frame_step, args.max_samples)
+    else:
+        recognize(args.root, args.workers, args.model, args.threshold, args.report)
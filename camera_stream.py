@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import time
+import cv2
+import settings
+import metrics
+
+CAMERA_BACKENDS = {
+    'any': cv2.CAP_ANY,
+    'v4l2': cv2.CAP_V4L2,
+    'dshow': cv2.CAP_DSHOW,
+    'msmf': cv2.CAP_MSMF,
+    'avfoundation': cv2.CAP_AVFOUNDATION,
+}
+
+
+def _load_cached_device(path):
+    """Lee el último dispositivo que funcionó"""
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        return int(cached['index']), cached['backend']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_cached_device(path, index, backend):
+    """Recuerda el dispositivo que funcionó para probarlo primero la próxima vez"""
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'index': index, 'backend': backend}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Advertencia: no se pudo guardar la cámara en caché: {str(e)}")
+
+
+def _configure_capture(capture):
+    """Aplica formato, resolución, FPS y tamaño de buffer configurados"""
+    if settings.CAMERA_FOURCC:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings.CAMERA_FOURCC[:4]))
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, settings.CAMERA_WIDTH)
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.CAMERA_HEIGHT)
+    if settings.CAMERA_FPS:
+        capture.set(cv2.CAP_PROP_FPS, settings.CAMERA_FPS)
+    if settings.CAMERA_BUFFER_SIZE:
+        # No todos los backends lo soportan; set() devuelve False en ese caso
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, settings.CAMERA_BUFFER_SIZE)
+
+
+def open_camera():
+    """
+    Abre la cámara probando primero el último dispositivo y backend que
+    funcionaron, si son compatibles con CAMERA_INDEX y CAMERA_BACKEND, y
+    después los configurados
+    Returns:
+        tuple: (cv2.VideoCapture abierto, dict con index, backend y open_ms)
+    Raises:
+        Exception: Si no se pudo abrir ninguna cámara
+    """
+    backend = settings.CAMERA_BACKEND
+    if backend not in CAMERA_BACKENDS:
+        raise Exception(f"Backend de cámara desconocido: {backend}")
+
+    if settings.CAMERA_INDEX is not None:
+        candidates = [(settings.CAMERA_INDEX, backend)]
+    else:
+        candidates = [(i, backend) for i in range(settings.CAMERA_MAX_INDEX)]
+    cached = _load_cached_device(settings.CAMERA_CACHE_PATH)
+    # La caché solo se usa si coincide con el índice y backend configurados,
+    # o si no se configuró ninguno; si no, un ajuste explícito quedaría ignorado
+    unconfigured = settings.CAMERA_INDEX is None and backend == 'any'
+    if cached is not None and cached[1] in CAMERA_BACKENDS and (cached in candidates or unconfigured):
+        candidates = [cached] + [c for c in candidates if c != cached]
+    else:
+        cached = None
+
+    start = time.perf_counter()
+    for index, name in candidates:
+        capture = cv2.VideoCapture(index, CAMERA_BACKENDS[name])
+        if not capture.isOpened():
+            capture.release()
+            continue
+
+        _configure_capture(capture)
+        info = {
+            'index': index,
+            'backend': name,
+            'open_ms': (time.perf_counter() - start) * 1000.0,
+            'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': capture.get(cv2.CAP_PROP_FPS),
+        }
+        if cached != (index, name):
+            _save_cached_device(settings.CAMERA_CACHE_PATH, index, name)
+        print(f"Cámara {index} ({name}) abierta en {info['open_ms']:.0f} ms")
+        return capture, info
+
+    raise Exception("No se pudo abrir ninguna cámara disponible")
+
+
+class CameraStream:
+    """
+    Lee frames de la cámara en un hilo dedicado y los guarda en un
+    buffer circular pequeño donde siempre gana el frame más reciente.
+
+    Los consumidores (vista previa, detección, registro) obtienen el
+    último frame sin bloquear el hilo de la interfaz.
+    """
+
+    def __init__(self, capture, buffer_size=3):
+        """
+        Args:
+            capture: cv2.VideoCapture ya abierto
+            buffer_size: Número de frames que conserva el buffer circular
+        """
+        self.capture = capture
+        self.buffer_size = max(1, buffer_size)
+        self._slots = [None] * self.buffer_size
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        # Número de secuencia del último frame escrito (0 = ninguno)
+        self.sequence = 0
+        self._last_consumed = 0
+
+        # Contadores expuestos
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.read_errors = 0
+        self.last_lag = 0.0
+        # Medias móviles de lo que bloquea read() y del intervalo entre frames
+        self.read_ms = 0.0
+        self.frame_interval_ms = 0.0
+        self._last_timestamp = None
+
+    def start(self):
+        """Inicia el hilo de captura si no está en ejecución"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='CameraStream', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Detiene el hilo de captura y espera a que termine"""
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def _run(self):
+        """Bucle del hilo de captura"""
+        while self._running:
+            started = time.monotonic()
+            ret, frame = self.capture.read()
+            timestamp = time.monotonic()
+            metrics.record('capture_read', (timestamp - started) * 1000.0)
+            if not ret:
+                self.read_errors += 1
+                time.sleep(0.01)
+                continue
+
+            self.read_ms = 0.9 * self.read_ms + 0.1 * (timestamp - started) * 1000.0
+            if self._last_timestamp is not None:
+                interval = (timestamp - self._last_timestamp) * 1000.0
+                self.frame_interval_ms = 0.9 * self.frame_interval_ms + 0.1 * interval
+            self._last_timestamp = timestamp
+
+            with self._condition:
+                self.sequence += 1
+                self._slots[self.sequence % self.buffer_size] = (self.sequence, timestamp, frame)
+                self.frames_captured += 1
+                self._condition.notify_all()
+
+    def _take(self, seq):
+        """Devuelve el frame de una secuencia y actualiza los contadores (requiere el lock)"""
+        _, timestamp, frame = self._slots[seq % self.buffer_size]
+        if seq > self._last_consumed:
+            # Frames escritos que ningún consumidor llegó a leer
+            dropped = max(0, seq - self._last_consumed - 1)
+            self.frames_dropped += dropped
+            if dropped:
+                metrics.count('camera_frames_dropped', dropped)
+            self._last_consumed = seq
+        self.last_lag = time.monotonic() - timestamp
+        return seq, frame
+
+    def latest(self):
+        """
+        Obtiene el frame más reciente sin bloquear
+        Returns:
+            tuple: (secuencia, frame) o (0, None) si aún no hay frames
+        """
+        with self._condition:
+            if self.sequence == 0:
+                return 0, None
+            return self._take(self.sequence)
+
+    def wait_newer(self, seq, timeout=1.0):
+        """
+        Espera un frame con secuencia mayor que `seq`. Pensado para
+        consumidores fuera del hilo de la interfaz.
+        Args:
+            seq: Última secuencia ya procesada por el consumidor
+            timeout: Tiempo máximo de espera en segundos
+        Returns:
+            tuple: (secuencia, frame) o (seq, None) si se agotó el tiempo
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self.sequence > seq or not self._running, timeout):
+                return seq, None
+            if self.sequence <= seq:
+                return seq, None
+            return self._take(self.sequence)
+
+    def stats(self):
+        """Devuelve los contadores de captura, pérdida y retraso"""
+        return {
+            'sequence': self.sequence,
+            'frames_captured': self.frames_captured,
+            'frames_dropped': self.frames_dropped,
+            'read_errors': self.read_errors,
+            'lag_ms': self.last_lag * 1000.0,
+            'read_ms': self.read_ms,
+            'frame_interval_ms': self.frame_interval_ms,
+        }
@@ -0,0 +1,200 @@
+import queue
+import threading
+import time
+import cv2
+from kivy.clock import Clock
+import settings
+from sample_store import normalize_face, SampleQualityGate
+
+
+class SampleWriter:
+    """
+    Hilo que escribe en el almacén las muestras aceptadas, para que la
+    captura no espere a la normalización ni al disco
+    """
+
+    def __init__(self, store, user_id, timestamp):
+        self.store = store
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.written = 0
+        self.error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='SampleWriter', daemon=True)
+        self._thread.start()
+
+    def put(self, face):
+        """Encola un recorte para escribirlo"""
+        self._queue.put(face)
+
+    def close(self):
+        """Espera a que se escriban todas las muestras encoladas"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            face = self._queue.get()
+            if face is None:
+                return
+            # Agrupar lo que ya esté encolado en una sola escritura
+            batch = [face]
+            done = False
+            while True:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is None:
+                    done = True
+                    break
+                batch.append(extra)
+
+            if self.error is None:
+                try:
+                    self.written += self.store.append(
+                        self.user_id, [normalize_face(f) for f in batch], self.timestamp)
+                except Exception as e:
+                    self.error = e
+                    print(f"Error guardando muestras: {str(e)}")
+            if done:
+                return
+
+
+class EnrollmentJob:
+    """
+    Captura de muestras de registro como trabajo en segundo plano.
+
+    Toma frames del hilo de captura compartido, detecta el rostro y pasa
+    los recortes que superan el SampleQualityGate a un SampleWriter.
+    Informa el progreso con eventos en el hilo de la interfaz y termina
+    por tiempo máximo o por demasiados frames seguidos sin rostro en
+    lugar de esperar indefinidamente. Las
+    muestras de un registro anterior solo se descartan si la captura
+    termina con éxito.
+    """
+
+    def __init__(self, face_recognition, user_id, samples=None, timeout=None,
+                 max_no_face_frames=None, on_progress=None, on_done=None):
+        """
+        Args:
+            face_recognition: Instancia de FaceRecognition
+            user_id: ID del usuario
+            samples: Muestras a capturar
+            timeout: Segundos máximos de captura
+            max_no_face_frames: Frames seguidos sin rostro antes de abortar
+            on_progress: Callback (capturadas, total) en el hilo de UI
+            on_done: Callback (éxito, mensaje) en el hilo de UI
+        """
+        self.face_recognition = face_recognition
+        self.user_id = user_id
+        self.samples = samples or settings.ENROLLMENT_SAMPLES
+        self.timeout = timeout or settings.ENROLLMENT_TIMEOUT
+        self.max_no_face_frames = max_no_face_frames or settings.ENROLLMENT_MAX_NO_FACE_FRAMES
+        self.on_progress = on_progress
+        self.on_done = on_done
+
+        self.accepted = 0
+        self.no_face_frames = 0
+        self.frames_seen = 0
+        self.last_box = None
+        self.quality = SampleQualityGate()
+        self.success = None
+        self.message = None
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Ejecuta la captura en un hilo sin bloquear la interfaz"""
+        self._thread = threading.Thread(target=self.run, name='EnrollmentJob', daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Cancela la captura; las muestras parciales se descartan"""
+        self._cancelled.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _emit(self, callback, *args):
+        if callback is not None:
+            Clock.schedule_once(lambda dt: callback(*args))
+
+    def _accept(self, gray, faces):
+        """Elige el recorte a guardar o None si se descarta"""
+        # Tomar solo el primer rostro detectado
+        (x, y, w, h) = faces[0]
+
+        # Validar región de interés
+        if w <= 20 or h <= 20:  # Tamaño mínimo del rostro
+            return None
+        self.last_box = (x, y, w, h)
+        return self.quality.check(gray[y:y+h, x:x+w])
+
+    def run(self):
+        """
+        Bucle de captura; puede llamarse directamente para una captura síncrona
+        Returns:
+            bool: True si se capturaron todas las muestras
+        """
+        fr = self.face_recognition
+        session = time.time()
+        writer = SampleWriter(fr.sample_store, self.user_id, session)
+        deadline = time.monotonic() + self.timeout
+        seq = 0
+        error = None
+
+        try:
+            while self.accepted < self.samples:
+                if self._cancelled.is_set():
+                    error = "Captura cancelada"
+                    break
+                if time.monotonic() > deadline:
+                    error = "Tiempo de captura agotado"
+                    break
+
+                seq, frame = fr.next_frame(seq, timeout=0.5)
+                if frame is None:
+                    continue
+                self.frames_seen += 1
+
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                faces = fr.detector.detect(gray, scale_factor=fr.detector.config.enrollment_scale_factor)
+                if len(faces) == 0:
+                    self.no_face_frames += 1
+                    if self.no_face_frames >= self.max_no_face_frames:
+                        error = "No se detectó ningún rostro"
+                        break
+                    continue
+                self.no_face_frames = 0
+
+                face = self._accept(gray, faces)
+                if face is None:
+                    continue
+
+                writer.put(face)
+                self.accepted += 1
+                self._emit(self.on_progress, self.accepted, self.samples)
+        except Exception as e:
+            error = f"Error durante la captura: {str(e)}"
+        finally:
+            writer.close()
+
+        if error is None and writer.error is not None:
+            error = f"Error guardando muestras: {str(writer.error)}"
+
+        if error is None:
+            # Las muestras nuevas sustituyen a las de un registro anterior
+            fr.sample_store.delete_user(self.user_id, before=session)
+            self.success, self.message = True, (
+                f"{self.accepted} muestras capturadas "
+                f"({self.quality.rejected_blurry} borrosas y "
+                f"{self.quality.rejected_duplicate} repetidas descartadas)")
+        else:
+            fr.sample_store.delete_user(self.user_id, timestamp=session)
+            self.success, self.message = False, error
+
+        print(self.message)
+        self._emit(self.on_done, self.success, self.message)
+        return self.success
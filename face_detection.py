@@ -0,0 +1,322 @@
+import os
+import cv2
+import settings
+
+
+class DetectionConfig:
+    """Parámetros de detección compartidos por reconocimiento y registro"""
+
+    def __init__(self, scale_factor=1.1, enrollment_scale_factor=1.3, min_neighbors=5,
+                 min_size=30, downscale=1.0, adaptive=False, adaptive_face_size=64,
+                 min_downscale=0.25):
+        self.scale_factor = scale_factor
+        self.enrollment_scale_factor = enrollment_scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.downscale = downscale
+        self.adaptive = adaptive
+        self.adaptive_face_size = adaptive_face_size
+        self.min_downscale = min_downscale
+
+    @classmethod
+    def from_settings(cls):
+        """Crea la configuración a partir de settings.py"""
+        return cls(
+            scale_factor=settings.DETECTION_SCALE_FACTOR,
+            enrollment_scale_factor=settings.DETECTION_ENROLLMENT_SCALE_FACTOR,
+            min_neighbors=settings.DETECTION_MIN_NEIGHBORS,
+            min_size=settings.DETECTION_MIN_SIZE,
+            downscale=settings.DETECTION_DOWNSCALE,
+            adaptive=settings.DETECTION_ADAPTIVE,
+            adaptive_face_size=settings.DETECTION_ADAPTIVE_FACE_SIZE,
+            min_downscale=settings.DETECTION_MIN_DOWNSCALE,
+        )
+
+
+class AdaptiveScale:
+    """
+    Escala de detección adaptativa de un único flujo de vídeo. Cada flujo
+    (cámara con o sin seguimiento) tiene la suya; las detecciones sueltas,
+    el registro y los procesos por lotes usan la escala fija configurada.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.scale = config.downscale
+
+    def update(self, faces):
+        """Elige la escala para el siguiente frame según el último rostro"""
+        if not self.config.adaptive:
+            return
+        if len(faces) == 0:
+            # Sin rostro se vuelve a la escala configurada
+            self.scale = self.config.downscale
+            return
+
+        width = max(w for (_, _, w, _) in faces)
+        scale = 1.0
+        # Escalas en potencias de dos: el rostro debe conservar adaptive_face_size
+        while scale / 2 >= self.config.min_downscale and width * scale / 2 >= self.config.adaptive_face_size:
+            scale /= 2
+        self.scale = scale
+
+
+class FaceDetector:
+    """
+    Interfaz común de los detectores de rostros. Trabaja sobre una copia
+    reducida del frame y devuelve las cajas en la resolución original, de
+    modo que el reconocimiento sigue usando recortes completos. Cada
+    backend implementa _detect_scaled(). El detector no guarda estado
+    entre llamadas y puede compartirse.
+    """
+
+    name = None
+
+    def __init__(self, config=None):
+        self.config = config or DetectionConfig.from_settings()
+
+    @classmethod
+    def available(cls):
+        """Indica si el backend puede usarse en este equipo"""
+        return True
+
+    def _detect_scaled(self, image, min_size, scale_factor):
+        """Detecta sobre la imagen ya reducida; devuelve cajas (x, y, w, h)"""
+        raise NotImplementedError
+
+    def detect(self, gray, scale_factor=None, adaptive=None):
+        """
+        Detecta rostros en una imagen en escala de grises
+        Args:
+            gray: Imagen en escala de grises (frame completo o región)
+            scale_factor: Sustituye el scaleFactor configurado
+            adaptive: AdaptiveScale del flujo; sin él se usa config.downscale
+        Returns:
+            list: Cajas (x, y, w, h) en coordenadas de `gray`
+        """
+        scale = min(1.0, adaptive.scale if adaptive is not None else self.config.downscale)
+        if scale < 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
+
+        min_size = max(1, int(round(self.config.min_size * scale)))
+        faces = self._detect_scaled(small, min_size, scale_factor or self.config.scale_factor)
+
+        boxes = [(int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+                 for (x, y, w, h) in faces]
+        if adaptive is not None:
+            adaptive.update(boxes)
+        return boxes
+
+
+class CascadeDetector(FaceDetector):
+    """Detector con clasificador en cascada de OpenCV"""
+
+    def __init__(self, cascade_path, config=None):
+        super().__init__(config)
+        if not cascade_path or not os.path.exists(cascade_path):
+            raise Exception(f"Archivo clasificador no encontrado en: {cascade_path}")
+
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise Exception("No se pudo cargar el clasificador de rostros")
+
+    def _detect_scaled(self, image, min_size, scale_factor):
+        return self.cascade.detectMultiScale(
+            image,
+            scaleFactor=scale_factor,
+            minNeighbors=self.config.min_neighbors,
+            minSize=(min_size, min_size)
+        )
+
+
+class HaarDetector(CascadeDetector):
+    """Clasificador Haar frontal (referencia)"""
+
+    name = 'haar'
+
+    @staticmethod
+    def cascade_path():
+        return cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+    @classmethod
+    def available(cls):
+        return os.path.exists(cls.cascade_path())
+
+    def __init__(self, config=None):
+        super().__init__(self.cascade_path(), config)
+
+
+class LBPCascadeDetector(CascadeDetector):
+    """Clasificador LBP frontal, más rápido que Haar"""
+
+    name = 'lbp'
+
+    @staticmethod
+    def cascade_path():
+        """Busca lbpcascade_frontalface en la ruta configurada o junto a las de Haar"""
+        haar_dir = os.path.dirname(os.path.normpath(cv2.data.haarcascades))
+        candidates = [
+            settings.DETECTOR_LBP_CASCADE,
+            os.path.join(haar_dir, 'lbpcascades', 'lbpcascade_frontalface_improved.xml'),
+            os.path.join(haar_dir, 'lbpcascades', 'lbpcascade_frontalface.xml'),
+        ]
+        for path in candidates:
+            if path and os.path.exists(path):
+                return path
+        return None
+
+    @classmethod
+    def available(cls):
+        return cls.cascade_path() is not None
+
+    def __init__(self, config=None):
+        super().__init__(self.cascade_path(), config)
+
+
+class YuNetDetector(FaceDetector):
+    """Detector DNN YuNet (cv2.FaceDetectorYN) con modelo ONNX"""
+
+    name = 'yunet'
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, 'FaceDetectorYN') and os.path.exists(settings.DETECTOR_YUNET_MODEL)
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        if not self.available():
+            raise Exception(f"YuNet no disponible: falta cv2.FaceDetectorYN o {settings.DETECTOR_YUNET_MODEL}")
+        self.model = cv2.FaceDetectorYN.create(
+            settings.DETECTOR_YUNET_MODEL, "", (320, 320), settings.DETECTOR_YUNET_SCORE)
+        self._input_size = (320, 320)
+
+    def _detect_scaled(self, image, min_size, scale_factor):
+        # YuNet espera una imagen BGR del tamaño configurado
+        size = (image.shape[1], image.shape[0])
+        if size != self._input_size:
+            self.model.setInputSize(size)
+            self._input_size = size
+        bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+        _, faces = self.model.detect(bgr)
+        if faces is None:
+            return []
+        return [(int(f[0]), int(f[1]), int(f[2]), int(f[3])) for f in faces
+                if f[2] >= min_size and f[3] >= min_size]
+
+
+DETECTOR_BACKENDS = {
+    HaarDetector.name: HaarDetector,
+    LBPCascadeDetector.name: LBPCascadeDetector,
+    YuNetDetector.name: YuNetDetector,
+}
+
+
+def create_detector(backend=None, config=None):
+    """
+    Crea el detector configurado; si el backend no está disponible se
+    usa el clasificador Haar, y si tampoco lo está se lanza una excepción
+    Args:
+        backend: Nombre del backend ('haar', 'lbp', 'yunet'); por defecto settings.DETECTOR_BACKEND
+        config: DetectionConfig; por defecto la de settings.py
+    Returns:
+        FaceDetector: Detector listo para usar
+    """
+    backend = backend or settings.DETECTOR_BACKEND
+    detector_class = DETECTOR_BACKENDS.get(backend)
+    if detector_class is None:
+        raise Exception(f"Backend de detección desconocido: {backend}")
+    if not detector_class.available():
+        if not HaarDetector.available():
+            if detector_class is HaarDetector:
+                raise Exception(f"Clasificador Haar no encontrado en: {HaarDetector.cascade_path()}")
+            raise Exception(f"Backend de detección '{backend}' no disponible y no hay "
+                            f"clasificador Haar en: {HaarDetector.cascade_path()}")
+        print(f"Advertencia: backend '{backend}' no disponible, se usa 'haar'")
+        detector_class = HaarDetector
+    return detector_class(config)
+
+
+def _overlap(a, b):
+    """Intersección sobre unión de dos cajas"""
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def benchmark(video_path, backends=None, max_frames=300, downscale=1.0):
+    """
+    Ejecuta cada backend sobre un vídeo grabado y mide la latencia por
+    frame y la sensibilidad (recall) respecto al clasificador Haar
+    Args:
+        video_path: Vídeo o secuencia de imágenes legible por cv2.VideoCapture
+        backends: Nombres de los backends; por defecto todos los disponibles
+        max_frames: Máximo de frames a procesar
+        downscale: Escala de detección común a todos los backends
+    Returns:
+        list: Diccionarios con backend, ms medio, p95 y recall
+    """
+    import time
+    import numpy as np
+
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    capture.release()
+    if not frames:
+        raise Exception(f"No se pudieron leer frames de {video_path}")
+
+    config = DetectionConfig.from_settings()
+    config.downscale = downscale
+
+    names = backends or [name for name, cls in DETECTOR_BACKENDS.items() if cls.available()]
+    if HaarDetector.name not in names:
+        names = [HaarDetector.name] + list(names)
+
+    detections = {}
+    results = []
+    for name in names:
+        detector = DETECTOR_BACKENDS[name](config)
+        latencies = []
+        detections[name] = []
+        for gray in frames:
+            start = time.perf_counter()
+            boxes = detector.detect(gray)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            detections[name].append(boxes)
+
+        # Recall: fracción de rostros de Haar que el backend también encuentra
+        found = total = 0
+        for reference, boxes in zip(detections[HaarDetector.name], detections[name]):
+            total += len(reference)
+            found += sum(1 for ref in reference if any(_overlap(ref, box) > 0.3 for box in boxes))
+        recall = found / total if total else float('nan')
+
+        latencies = np.array(latencies)
+        results.append({'backend': name, 'frames': len(frames), 'mean_ms': float(latencies.mean()),
+                        'p95_ms': float(np.percentile(latencies, 95)), 'recall': recall})
+
+    print(f"{'backend':<8} {'frames':>6} {'media ms':>9} {'p95 ms':>8} {'recall':>7}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['frames']:>6} {r['mean_ms']:>9.2f} {r['p95_ms']:>8.2f} {r['recall']:>7.2%}")
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compara los backends de detección de rostros')
+    parser.add_argument('video', help='Vídeo grabado o patrón de imágenes (img_%%04d.jpg)')
+    parser.add_argument('--backends', help='Lista separada por comas (haar,lbp,yunet)')
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('--downscale', type=float, default=1.0)
+    args = parser.parse_args()
+    benchmark(args.video, args.backends.split(',') if args.backends else None,
+              args.max_frames, args.downscale)
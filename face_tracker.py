@@ -0,0 +1,156 @@
+import time
+from collections import deque
+
+
+class FaceTracker:
+    """
+    Bucle de detección y seguimiento de un rostro.
+
+    La detección completa sobre el frame solo se ejecuta cada
+    `full_interval` frames o cuando se pierde el rostro; en los frames
+    intermedios el clasificador se vuelve a ejecutar únicamente en una
+    región ampliada alrededor de la última caja. El resultado del
+    reconocimiento se reutiliza mientras su confianza, que se degrada con
+    cada frame, siga por debajo del umbral.
+    """
+
+    def __init__(self, detect, full_interval=10, roi_margin=0.5, max_misses=2,
+                 threshold=85, confidence_decay=2.0, reuse_recognition=True):
+        """
+        Args:
+            detect: Función detect(gray) -> lista de cajas (x, y, w, h)
+            full_interval: Frames entre detecciones completas
+            roi_margin: Ampliación de la caja (fracción de su tamaño) para buscar
+            max_misses: Fallos seguidos en la región antes de darlo por perdido
+            threshold: Umbral de confianza del reconocimiento
+            confidence_decay: Cuánto empeora la confianza por frame reutilizado
+            reuse_recognition: Si es False se reconoce en cada frame (sesiones
+                que acumulan evidencia de varios frames)
+        """
+        self.detect = detect
+        self.full_interval = full_interval
+        self.roi_margin = roi_margin
+        self.max_misses = max_misses
+        self.threshold = threshold
+        self.confidence_decay = confidence_decay
+        self.reuse_recognition = reuse_recognition
+
+        self.box = None
+        self.label = None
+        self.confidence = None
+        self._frames_since_full = 0
+        self._frames_since_recognition = 0
+        self._misses = 0
+
+        # Contadores
+        self.full_detections = 0
+        self.roi_detections = 0
+        self._detection_times = deque()
+
+    def reset(self):
+        """Olvida el rostro seguido"""
+        self.box = None
+        self.label = None
+        self.confidence = None
+        self._misses = 0
+
+    def _count_detection(self):
+        now = time.monotonic()
+        self._detection_times.append(now)
+        while self._detection_times and now - self._detection_times[0] > 1.0:
+            self._detection_times.popleft()
+
+    def _detect_full(self, gray):
+        self.full_detections += 1
+        self._count_detection()
+        self._frames_since_full = 0
+        return list(self.detect(gray))
+
+    def _detect_roi(self, gray):
+        x, y, w, h = self.box
+        mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(gray.shape[1], x + w + mx), min(gray.shape[0], y + h + my)
+
+        self.roi_detections += 1
+        self._count_detection()
+        faces = self.detect(gray[y0:y1, x0:x1])
+        return [(fx + x0, fy + y0, fw, fh) for (fx, fy, fw, fh) in faces]
+
+    def update(self, gray):
+        """
+        Localiza el rostro en un nuevo frame
+        Args:
+            gray: Frame en escala de grises
+        Returns:
+            tuple or None: Caja (x, y, w, h) del rostro seguido
+        """
+        self._frames_since_full += 1
+        if self.box is None or self._frames_since_full >= self.full_interval:
+            faces = self._detect_full(gray)
+        else:
+            faces = self._detect_roi(gray)
+            if len(faces) == 0:
+                self._misses += 1
+                if self._misses <= self.max_misses:
+                    return None
+                # Rostro perdido: búsqueda completa en este mismo frame
+                faces = self._detect_full(gray)
+
+        if len(faces) == 0:
+            self.reset()
+            return None
+
+        # Se sigue el rostro más grande
+        box = tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+        if self.box is not None and not self._overlaps(self.box, box):
+            # Es otro rostro: el reconocimiento anterior no aplica
+            self.label = None
+            self.confidence = None
+        self.box = box
+        self._misses = 0
+        self._frames_since_recognition += 1
+        return box
+
+    @staticmethod
+    def _overlaps(a, b):
+        """Indica si dos cajas se solapan lo suficiente para ser el mismo rostro"""
+        ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+        iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+        intersection = ix * iy
+        union = a[2] * a[3] + b[2] * b[3] - intersection
+        return union > 0 and intersection / union > 0.3
+
+    def decayed_confidence(self):
+        """Confianza del último reconocimiento degradada por los frames transcurridos"""
+        if self.confidence is None:
+            return None
+        return self.confidence + self._frames_since_recognition * self.confidence_decay
+
+    def needs_recognition(self):
+        """Indica si hay que volver a reconocer el rostro seguido"""
+        if not self.reuse_recognition:
+            return True
+        confidence = self.decayed_confidence()
+        return confidence is None or confidence >= self.threshold
+
+    def set_recognition(self, label, confidence):
+        """Guarda el resultado del reconocimiento para reutilizarlo"""
+        self.label = label
+        self.confidence = confidence
+        self._frames_since_recognition = 0
+
+    def detections_per_second(self):
+        """Llamadas al clasificador en el último segundo"""
+        now = time.monotonic()
+        while self._detection_times and now - self._detection_times[0] > 1.0:
+            self._detection_times.popleft()
+        return len(self._detection_times)
+
+    def stats(self):
+        """Devuelve los contadores de detección"""
+        return {
+            'full_detections': self.full_detections,
+            'roi_detections': self.roi_detections,
+            'detections_per_second': self.detections_per_second(),
+        }
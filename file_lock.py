@@ -0,0 +1,31 @@
+import contextlib
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def exclusive(lock_path):
+    """
+    Bloqueo exclusivo de archivo entre procesos (flock o msvcrt.locking).
+    Cada llamada abre su propio descriptor, así que también excluye a
+    otros hilos del mismo proceso.
+    Args:
+        lock_path: Archivo de bloqueo; se crea si no existe
+    """
+    with open(lock_path, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -1,3 +1,8 @@
+import time
+
+# Referencia para medir el arranque
+STARTED = time.perf_counter()
+
 from kivy.app import App
 from kivy.uix.popup import Popup
 from kivy.uix.label import Label
@@ -7,13 +12,57 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.image import Image
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.clock import Clock
-from auth import AuthSystem
-from face_recognition import FaceRecognition
+from recognition_pipeline import RecognitionWorker
+from recognition_session import RecognitionSession
+from recognition_service import RecognitionService
+from user_repository import UserRepository
+from account_service import AccountService
+import settings
+import metrics
+
+def show_texture(image, texture):
+    """Asigna la textura al widget o fuerza el redibujado si es la misma"""
+    if image.texture is texture:
+        image.canvas.ask_update()
+    else:
+        image.texture = texture
+
+def show_error_popup(message):
+    """Muestra un mensaje de error en un popup"""
+    popup = Popup(title='Error',
+                 content=Label(text=message),
+                 size_hint=(None, None), 
+                 size=(400, 200))
+    popup.open()
+
+def set_busy(widgets, busy):
+    """Deshabilita los controles mientras hay una operación en curso"""
+    for widget in widgets:
+        widget.disabled = busy
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager que construye algunas pantallas la primera vez que se piden"""
+
+    def __init__(self, **kwargs):
+        self.factories = {}
+        super().__init__(**kwargs)
+
+    def add_lazy(self, name, factory):
+        """Registra una pantalla que se construye con factory(name=name) al usarla"""
+        self.factories[name] = factory
+
+    def get_screen(self, name):
+        factory = self.factories.pop(name, None)
+        if factory is not None:
+            self.add_widget(factory(name=name))
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in self.factories or super().has_screen(name)
 
 class LoginScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.auth = AuthSystem()
         self.layout = BoxLayout(orientation='vertical', padding=50, spacing=20)
         
         self.username = TextInput(hint_text='Usuario', multiline=False)
@@ -36,13 +85,29 @@ class LoginScreen(Screen):
         self.add_widget(self.layout)
     
     def login(self, instance):
-        user = self.auth.login_user(self.username.text, self.password.text)
-        if user:
+        # La verificación de la contraseña corre fuera del hilo de la interfaz
+        self._set_busy(True)
+        App.get_running_app().accounts.login(
+            self.username.text, self.password.text, self._on_login_result)
+    
+    def _on_login_result(self, user, error):
+        self._set_busy(False)
+        if error is not None:
+            show_error_popup(f'Error al iniciar sesión: {str(error)}')
+        elif user:
+            self.password.text = ''
             self.manager.current = 'main'
         else:
-            self.auth.show_error_popup('Usuario o contraseña incorrectos')
+            show_error_popup('Usuario o contraseña incorrectos')
+    
+    def _set_busy(self, busy):
+        self.login_btn.text = 'Verificando...' if busy else 'Iniciar Sesión'
+        set_busy([self.username, self.password, self.login_btn,
+                  self.register_btn, self.face_login_btn], busy)
     
     def face_login(self, instance):
+        # Con usuario escrito se verifica solo contra ese usuario (1:1)
+        self.manager.get_screen('face_login').username = self.username.text.strip()
         self.manager.current = 'face_login'
     
     def go_to_register(self, instance):
@@ -51,7 +116,6 @@ class LoginScreen(Screen):
 class RegisterScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.auth = AuthSystem()
         self.layout = BoxLayout(orientation='vertical', padding=50, spacing=20)
         
         self.username = TextInput(hint_text='Usuario', multiline=False)
@@ -74,17 +138,30 @@ class RegisterScreen(Screen):
     
     def register(self, instance):
         if self.password.text != self.confirm_password.text:
-            self.auth.show_error_popup('Las contraseñas no coinciden')
+            show_error_popup('Las contraseñas no coinciden')
             return
         
         if len(self.password.text) < 6:
-            self.auth.show_error_popup('La contraseña debe tener al menos 6 caracteres')
+            show_error_popup('La contraseña debe tener al menos 6 caracteres')
             return
         
-        if self.auth.register_user(self.username.text, self.password.text):
+        self._set_busy(True)
+        App.get_running_app().accounts.register(
+            self.username.text, self.password.text, self._on_register_result)
+    
+    def _on_register_result(self, user_id, error):
+        self._set_busy(False)
+        if error is not None:
+            show_error_popup(f'Error en el registro: {str(error)}')
+        elif user_id is not None:
             self.manager.current = 'face_enrollment'
         else:
-            self.auth.show_error_popup('El usuario ya existe')
+            show_error_popup('El usuario ya existe')
+    
+    def _set_busy(self, busy):
+        self.register_btn.text = 'Registrando...' if busy else 'Registrarse'
+        set_busy([self.username, self.password, self.confirm_password,
+                  self.register_btn, self.back_btn], busy)
     
     def go_to_login(self, instance):
         self.manager.current = 'login'
@@ -104,16 +181,59 @@ class FaceLoginScreen(Screen):
         self.layout.add_widget(self.status_label)
         self.layout.add_widget(self.back_btn)
         
+        # Métricas por etapa sobre la vista de la cámara (opcional)
+        self.metrics_label = None
+        self.metrics_event = None
+        if metrics.registry.enabled and settings.METRICS_OVERLAY:
+            self.metrics_label = Label(font_size=11, halign='left', valign='top',
+                                       size_hint=(1, 0.3))
+            self.layout.add_widget(self.metrics_label, index=2)
+        
         self.add_widget(self.layout)
         self.face_event = None
         self.face_recognition = None
+        self.recognition_worker = None
+        self.last_sequence = 0
+        self.last_faces = []
+        self.username = ''
+        self.verify_face_id = None
+        self.retry_event = None
+    
+    def _resolve_verify_face_id(self):
+        """
+        Obtiene el face_id del usuario escrito en el login
+        Returns:
+            int or None: face_id, o None si no se escribió usuario
+        Raises:
+            Exception: Si el usuario no existe o no tiene rostro registrado
+        """
+        if not self.username:
+            return None
+        user = App.get_running_app().users.get_by_username(self.username)
+        if not user or user['face_id'] is None:
+            raise Exception(f"El usuario {self.username} no tiene rostro registrado")
+        return user['face_id']
     
     def on_enter(self):
         """Se ejecuta cuando se muestra la pantalla"""
         try:
-            self.face_recognition = FaceRecognition()
+            self.verify_face_id = self._resolve_verify_face_id()
+            self.face_recognition = App.get_running_app().recognition.attach(self)
+            # Se reconoce en cada frame: la sesión acumula la evidencia
+            self.face_recognition.enable_tracking(reuse_recognition=False)
+            self.recognition_worker = RecognitionWorker(
+                self.face_recognition, self.on_recognition, self.verify_face_id,
+                session=RecognitionSession())
+            self.recognition_worker.start()
+            self.last_sequence = 0
+            self.last_faces = []
             self.face_event = Clock.schedule_interval(self.update, 1.0/30.0)
-            self.status_label.text = "Cámara iniciada correctamente"
+            if self.metrics_label is not None:
+                self.metrics_event = Clock.schedule_interval(self.update_metrics, 0.5)
+            if self.verify_face_id is not None:
+                self.status_label.text = f"Verificando a {self.username}"
+            else:
+                self.status_label.text = "Cámara iniciada correctamente"
         except Exception as e:
             self.status_label.text = f"Error: {str(e)}"
             if hasattr(self, 'face_event') and self.face_event:
@@ -124,29 +244,76 @@ class FaceLoginScreen(Screen):
         if not hasattr(self, 'face_recognition') or not self.face_recognition:
             return
             
-        ret, frame = self.face_recognition.capture.read()
-        if ret:
-            # Solo intentar reconocimiento si hay modelo cargado
-            if self.face_recognition.model_loaded:
-                face_id = self.face_recognition.detect_faces(frame)
-                if face_id is not None:
-                    auth = AuthSystem()
-                    user = auth.login_with_face(face_id)
-                    if user:
-                        self.manager.current = 'main'
-                        return
+        seq, frame = self.face_recognition.read_latest()
+        if frame is not None and seq != self.last_sequence:
+            self.last_sequence = seq
+            metrics.count('frames')
+            # Solo intentar reconocimiento si hay modelo cargado y la sesión
+            # no ha decidido; el worker descarta los frames que lleguen
+            # mientras está ocupado
+            if self.face_recognition.model_loaded and not self.recognition_worker.decided:
+                self.recognition_worker.submit(seq, frame)
+            
+            # Dibujar los últimos resultados sobre una copia para no
+            # modificar el frame que procesa el worker
+            if self.last_faces:
+                frame = frame.copy()
+                self.face_recognition.draw_faces(frame, self.last_faces)
             
             # Mostrar la imagen de la cámara
-            texture = self.face_recognition.frame_to_texture(frame)
+            texture = self.face_recognition.frame_to_texture(frame, seq)
             if texture:
-                self.image.texture = texture
+                show_texture(self.image, texture)
+                App.get_running_app().mark_startup('first_camera_frame')
+    
+    def on_recognition(self, result):
+        """Recibe en el hilo de UI el resultado del worker de reconocimiento"""
+        session = result.get('session')
+        if session is not self.recognition_worker.session:
+            return  # Resultado de una sesión anterior
+        self.last_faces = result['faces']
+        decision = result.get('decision')
+        if decision == RecognitionSession.ACCEPTED:
+            # Se resuelve desde el mapa en memoria, sin consultar la base de datos
+            with metrics.timed('user_lookup'):
+                user = App.get_running_app().users.get_by_face_id(session.label)
+            if user:
+                self.manager.current = 'main'
+                return
+            decision = RecognitionSession.REJECTED
+        if decision == RecognitionSession.REJECTED:
+            self.last_faces = []
+            self.status_label.text = "Rostro no reconocido, reintentando..."
+            self.retry_event = Clock.schedule_once(self._retry, 2.0)
+    
+    def update_metrics(self, dt):
+        """Refresca el texto de las métricas"""
+        self.metrics_label.text_size = self.metrics_label.size
+        self.metrics_label.text = metrics.registry.overlay_text()
+    
+    def _retry(self, dt):
+        """Inicia una nueva sesión de decisión tras un rechazo"""
+        self.retry_event = None
+        if self.recognition_worker:
+            self.recognition_worker.set_session(RecognitionSession())
+            self.status_label.text = 'Mire a la cámara para reconocimiento facial'
     
     def on_leave(self):
         """Se ejecuta cuando se abandona la pantalla"""
         if self.face_event:
             self.face_event.cancel()
+        if self.retry_event:
+            self.retry_event.cancel()
+            self.retry_event = None
+        if self.metrics_event:
+            self.metrics_event.cancel()
+            self.metrics_event = None
+        if self.recognition_worker:
+            self.recognition_worker.stop()
+            self.recognition_worker = None
         if hasattr(self, 'face_recognition') and self.face_recognition:
-            self.face_recognition.release_camera()
+            self.face_recognition.disable_tracking()
+            App.get_running_app().recognition.detach(self)
     
     def go_to_login(self, instance):
         """Regresa a la pantalla de login"""
@@ -155,7 +322,6 @@ class FaceLoginScreen(Screen):
 class FaceEnrollmentScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.auth = AuthSystem()  # Inicializar el sistema de autenticación
         self.layout = BoxLayout(orientation='vertical', spacing=20, padding=50)
         
         # Componentes de la UI
@@ -188,12 +354,15 @@ class FaceEnrollmentScreen(Screen):
         self.capture_event = None
         self.capturing = False
         self.samples_captured = 0
-        self.total_samples = 5
+        self.total_samples = settings.ENROLLMENT_SAMPLES
+        self.last_sequence = 0
+        self.enrollment_job = None
 
     def on_enter(self):
         """Se ejecuta cuando se muestra esta pantalla"""
         try:
-            self.face_recognition = FaceRecognition()
+            self.face_recognition = App.get_running_app().recognition.attach(self)
+            self.last_sequence = 0
             self.capture_event = Clock.schedule_interval(self.update_camera, 1.0/30.0)
         except Exception as e:
             self.show_error(f"No se pudo iniciar la cámara: {str(e)}")
@@ -203,19 +372,25 @@ class FaceEnrollmentScreen(Screen):
         """Se ejecuta cuando se abandona esta pantalla"""
         if self.capture_event:
             self.capture_event.cancel()
+        if self.enrollment_job:
+            self.enrollment_job.cancel()
+            self.enrollment_job = None
+            self.reset_capture_state()
         if hasattr(self, 'face_recognition') and self.face_recognition:
-            self.face_recognition.release_camera()
+            App.get_running_app().recognition.detach(self)
 
     def update_camera(self, dt):
         """Actualiza la vista previa de la cámara"""
         if not hasattr(self, 'face_recognition') or not self.face_recognition:
             return
             
-        ret, frame = self.face_recognition.capture.read()
-        if ret:
-            texture = self.face_recognition.frame_to_texture(frame)
+        seq, frame = self.face_recognition.read_latest()
+        if frame is not None and seq != self.last_sequence:
+            self.last_sequence = seq
+            texture = self.face_recognition.frame_to_texture(frame, seq)
             if texture:
-                self.image.texture = texture
+                show_texture(self.image, texture)
+                App.get_running_app().mark_startup('first_camera_frame')
 
     def start_capture(self, instance):
         """Inicia el proceso de captura de muestras faciales"""
@@ -228,15 +403,11 @@ class FaceEnrollmentScreen(Screen):
             return
             
         # Obtener el ID del usuario desde la base de datos
-        user = self.auth.cursor.execute(
-            'SELECT id FROM users WHERE username=?', (username,)
-        ).fetchone()
+        user_id = App.get_running_app().users.get_user_id(username)
         
-        if not user:
+        if user_id is None:
             self.show_error("Usuario no encontrado en la base de datos")
             return
-            
-        user_id = user[0]
         
         # Cambiar el estado a "capturando"
         self.capturing = True
@@ -244,72 +415,66 @@ class FaceEnrollmentScreen(Screen):
         self.status_label.text = "Capturando muestras de su rostro..."
         self.progress_label.text = f"Progreso: 0/{self.total_samples}"
         
-        # Usar un hilo separado para la captura
-        Clock.schedule_once(lambda dt: self._capture_samples(user_id))
+        # La captura corre en segundo plano y notifica el progreso
+        from enrollment import EnrollmentJob
+        self.enrollment_job = EnrollmentJob(
+            self.face_recognition, user_id, self.total_samples,
+            on_progress=self._on_capture_progress,
+            on_done=lambda success, message: self._on_capture_done(user_id, success, message))
+        self.enrollment_job.start()
 
-    def _capture_samples(self, user_id):
-        """Método que maneja la captura de muestras en segundo plano"""
-        try:
-            success = self.face_recognition.capture_face_samples(
-                user_id, self.total_samples)
-            
-            if success:
-                self.progress_label.text = "Entrenando modelo..."
-                self.train_model(user_id)
-            else:
-                self.show_error("No se pudieron capturar suficientes muestras")
-                self.reset_capture_state()
-                
-        except Exception as e:
-            self.show_error(f"Error durante la captura: {str(e)}")
+    def _on_capture_progress(self, captured, total):
+        """Actualiza el progreso de la captura"""
+        self.samples_captured = captured
+        self.progress_label.text = f"Progreso: {captured}/{total}"
+
+    def _on_capture_done(self, user_id, success, message):
+        """Maneja el final de la captura de muestras"""
+        self.enrollment_job = None
+        if not self.capturing:
+            return
+        
+        if success:
+            self.progress_label.text = "Entrenando modelo..."
+            self.train_model(user_id)
+        else:
+            self.show_error(f"No se pudieron capturar suficientes muestras: {message}")
             self.reset_capture_state()
 
     def train_model(self, user_id):
-        """Entrena el modelo con las nuevas muestras"""
+        """Encola las nuevas muestras en el planificador de entrenamiento"""
         try:
-            # Ejecutar el entrenamiento en un hilo separado
-            from threading import Thread
-            def train_thread():
-                try:
-                    import subprocess
-                    result = subprocess.run(
-                        ['python', 'train_faces.py'],
-                        capture_output=True,
-                        text=True
-                    )
-                    
-                    # Actualizar UI en el hilo principal
-                    Clock.schedule_once(
-                        lambda dt: self._handle_train_result(result, user_id))
-                except Exception as e:
-                    Clock.schedule_once(
-                        lambda dt: self.show_error(f"Error en entrenamiento: {str(e)}"))
-            
-            Thread(target=train_thread, daemon=True).start()
-            
+            # Los registros seguidos se agrupan en una sola pasada
+            job = App.get_running_app().recognition.training.submit(user_id)
+            job.subscribe(
+                on_done=lambda job: self._handle_train_result(job.succeeded_for(user_id), user_id, job),
+                on_progress=self._on_train_progress)
         except Exception as e:
             self.show_error(f"Error iniciando entrenamiento: {str(e)}")
             self.reset_capture_state()
 
-    def _handle_train_result(self, result, user_id):
+    def _on_train_progress(self, done, total):
+        """Actualiza el progreso del entrenamiento"""
+        self.progress_label.text = f"Entrenando modelo... {done}/{total}"
+
+    def _handle_train_result(self, success, user_id, job=None):
         """Maneja el resultado del entrenamiento"""
-        if result.returncode == 0:
-            # Actualizar la base de datos
-            self.auth.cursor.execute(
-                'UPDATE users SET face_id=? WHERE id=?', 
-                (user_id, user_id))
-            self.auth.conn.commit()
+        if success:
+            # Actualizar la base de datos (invalida el mapa face_id -> usuario)
+            App.get_running_app().users.set_face_id(user_id, user_id)
             
             self.status_label.text = "¡Registro completado con éxito!"
-            self.progress_label.text = "Modelo actualizado correctamente"
+            if job is not None and job.duration is not None:
+                self.progress_label.text = f"Modelo actualizado en {job.duration:.1f} s"
+            else:
+                self.progress_label.text = "Modelo actualizado correctamente"
             
             # Volver a la pantalla principal después de 2 segundos
             Clock.schedule_once(
                 lambda dt: setattr(self.manager, 'current', 'main'), 
                 2.0)
         else:
-            error_msg = result.stderr or "Error desconocido durante el entrenamiento"
-            self.show_error(f"Error en entrenamiento: {error_msg}")
+            self.show_error("Error en entrenamiento: no se pudo actualizar el modelo")
             self.reset_capture_state()
 
     def reset_capture_state(self):
@@ -322,11 +487,7 @@ class FaceEnrollmentScreen(Screen):
 
     def show_error(self, message):
         """Muestra un mensaje de error en un popup"""
-        popup = Popup(title='Error',
-                     content=Label(text=message),
-                     size_hint=(None, None), 
-                     size=(400, 200))
-        popup.open()
+        show_error_popup(message)
 
     def go_back(self, instance):
         """Regresa a la pantalla anterior"""
@@ -341,13 +502,59 @@ class MainScreen(Screen):
 
 class FaceRecognitionApp(App):
     def build(self):
-        sm = ScreenManager()
+        # Servicio de reconocimiento y repositorio de usuarios compartidos
+        # por las pantallas
+        self.recognition = RecognitionService()
+        self.users = UserRepository()
+        self.accounts = AccountService(self.users)
+        
+        # Tiempos de arranque en ms desde STARTED
+        self.startup = {}
+        
+        sm = LazyScreenManager()
         sm.add_widget(LoginScreen(name='login'))
         sm.add_widget(RegisterScreen(name='register'))
-        sm.add_widget(FaceLoginScreen(name='face_login'))
-        sm.add_widget(FaceEnrollmentScreen(name='face_enrollment'))
         sm.add_widget(MainScreen(name='main'))
+        if settings.STARTUP_DEFERRED:
+            # Las pantallas de cámara se construyen al abrirlas
+            sm.add_lazy('face_login', FaceLoginScreen)
+            sm.add_lazy('face_enrollment', FaceEnrollmentScreen)
+        else:
+            sm.add_widget(FaceLoginScreen(name='face_login'))
+            sm.add_widget(FaceEnrollmentScreen(name='face_enrollment'))
         return sm
+    
+    def on_start(self):
+        metrics.start_export()
+        if settings.STARTUP_DEFERRED:
+            # Primero se dibuja el login; después se carga OpenCV, el
+            # clasificador, el modelo y la cámara en segundo plano
+            Clock.schedule_once(self._after_first_draw, 0)
+        else:
+            self._warm_up()
+            Clock.schedule_once(lambda dt: self.mark_startup('login_screen'), 0)
+    
+    def _after_first_draw(self, dt):
+        self.mark_startup('login_screen')
+        self._warm_up()
+    
+    def _warm_up(self):
+        self.recognition.warm_up(on_ready=lambda service: self.mark_startup('warm_up'))
+    
+    def mark_startup(self, event):
+        """Registra e informa la primera vez que ocurre un hito del arranque"""
+        if event in self.startup:
+            return
+        ms = (time.perf_counter() - STARTED) * 1000.0
+        self.startup[event] = ms
+        metrics.record(f'startup_{event}', ms)
+        print(f"Arranque: {event} a los {ms:.0f} ms")
+    
+    def on_stop(self):
+        metrics.stop_export()
+        self.recognition.shutdown()
+        self.accounts.shutdown()
+        self.users.close()
 
 if __name__ == '__main__':
     FaceRecognitionApp().run()
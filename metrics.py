@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from collections import deque
+import settings
+
+
+class _NullTimer:
+    """Temporizador vacío que se usa cuando las métricas están desactivadas"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record(self.name, (time.perf_counter() - self.start) * 1000.0)
+        return False
+
+
+class Metrics:
+    """
+    Tiempos por etapa y contadores del camino crítico.
+
+    Cada etapa conserva las últimas `window` mediciones en milisegundos,
+    de las que se calculan p50, p95 y p99 al pedir una instantánea.
+    Desactivado, timed() devuelve un temporizador vacío compartido y
+    count() retorna de inmediato, de modo que el coste es una llamada.
+    """
+
+    def __init__(self, enabled=False, window=512):
+        self.enabled = enabled
+        self.window = window
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def timed(self, name):
+        """
+        Mide el bloque `with` como la etapa `name`
+        Args:
+            name: Nombre de la etapa
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+
+    def record(self, name, ms):
+        """Agrega una medición en milisegundos a una etapa"""
+        if not self.enabled:
+            return
+        samples = self._stages.get(name)
+        if samples is None:
+            with self._lock:
+                samples = self._stages.setdefault(name, deque(maxlen=self.window))
+        samples.append(ms)
+
+    def count(self, name, n=1):
+        """Incrementa un contador"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+            self._started = time.monotonic()
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: 'time', 'uptime_s', 'stages' con count, mean y p50/p95/p99
+                  en ms, y 'counters'
+        """
+        # numpy solo se importa al pedir una instantánea, no al arrancar
+        import numpy as np
+
+        with self._lock:
+            stages = {name: np.array(samples, dtype=np.float64)
+                      for name, samples in self._stages.items()}
+            counters = dict(self._counters)
+
+        summary = {}
+        for name, values in sorted(stages.items()):
+            if len(values) == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            summary[name] = {
+                'count': int(len(values)),
+                'mean': float(values.mean()),
+                'p50': float(p50),
+                'p95': float(p95),
+                'p99': float(p99),
+            }
+        return {
+            'time': time.time(),
+            'uptime_s': time.monotonic() - self._started,
+            'stages': summary,
+            'counters': counters,
+        }
+
+    def overlay_text(self):
+        """Texto compacto con las métricas para mostrarlo sobre la cámara"""
+        snapshot = self.snapshot()
+        lines = [f"{name}: p50 {s['p50']:.1f} p95 {s['p95']:.1f} p99 {s['p99']:.1f} ms"
+                 for name, s in snapshot['stages'].items()]
+        if snapshot['counters']:
+            lines.append('  '.join(f"{name}={value}" for name, value in sorted(snapshot['counters'].items())))
+        return '\n'.join(lines)
+
+
+class JsonLinesExporter:
+    """Hilo que añade una instantánea de las métricas a un archivo JSON lines"""
+
+    def __init__(self, registry, path, interval=5.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='MetricsExporter', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval)
+            self._thread = None
+        self.write()
+
+    def write(self):
+        """Escribe una instantánea"""
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(self.registry.snapshot()) + '\n')
+        except OSError as e:
+            print(f"Error exportando métricas: {str(e)}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+
+# Registro compartido por todos los módulos
+registry = Metrics(settings.METRICS_ENABLED, settings.METRICS_WINDOW)
+timed = registry.timed
+count = registry.count
+record = registry.record
+
+_exporter = None
+
+
+def start_export(path=None, interval=None):
+    """Inicia el volcado periódico si hay métricas activas y ruta configurada"""
+    global _exporter
+    path = path or settings.METRICS_EXPORT_PATH
+    if not registry.enabled or not path or _exporter is not None:
+        return None
+    _exporter = JsonLinesExporter(registry, path, interval or settings.METRICS_EXPORT_INTERVAL)
+    _exporter.start()
+    return _exporter
+
+
+def stop_export():
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
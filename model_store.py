@@ -0,0 +1,233 @@
+import os
+import struct
+import tempfile
+import threading
+import numpy as np
+import file_lock
+from lbph_matcher import LBPHMatcher
+
+MODEL_BIN_PATH = 'models/recognizer.bin'
+
+MAGIC = b'LBPHBIN\0'
+VERSION = 1
+# magic, versión, muestras, dimensiones, radius, neighbors, grid_x, grid_y
+HEADER = struct.Struct('<8sIQIIIII')
+HEADER_SIZE = 64
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(count, dimensions):
+    """Desplazamientos de etiquetas, totales e histogramas dentro del archivo"""
+    labels_offset = HEADER_SIZE
+    totals_offset = _aligned(labels_offset + 4 * count)
+    columns_offset = _aligned(totals_offset + 8 * count)
+    end = columns_offset + 4 * count * dimensions
+    return labels_offset, totals_offset, columns_offset, end
+
+
+# Bytes aproximados de cada bloque de filas copiado al escribir el modelo
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def _row_blocks(dimensions, count):
+    """Rangos de filas de la matriz (d, n) que caben en BLOCK_BYTES"""
+    rows = max(1, BLOCK_BYTES // max(1, 4 * count))
+    for start in range(0, dimensions, rows):
+        yield start, min(dimensions, start + rows)
+
+
+def _lock_path(path):
+    return f'{path}.lock'
+
+
+def _write_model(path, params, labels, totals, blocks):
+    """
+    Escribe un modelo completo en un archivo temporal propio y lo renombra
+    sobre `path`; quien llama debe tener el bloqueo del modelo
+    Args:
+        params: (radius, neighbors, grid_x, grid_y)
+        labels, totals: Vectores (n,) de etiquetas y sumas de cada histograma
+        blocks: Iterable de bloques consecutivos de filas (rows, n) de la matriz
+    Returns:
+        tuple: Firma (mtime_ns, tamaño, inodo) del archivo escrito
+    """
+    radius, neighbors, grid_x, grid_y = params
+    count = len(labels)
+    dimensions = grid_x * grid_y * 2 ** neighbors
+    labels_offset, totals_offset, columns_offset, end = _layout(count, dimensions)
+
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            header = HEADER.pack(MAGIC, VERSION, count, dimensions, radius, neighbors, grid_x, grid_y)
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            f.seek(labels_offset)
+            f.write(np.ascontiguousarray(labels, dtype='<i4').tobytes())
+            f.seek(totals_offset)
+            f.write(np.ascontiguousarray(totals, dtype='<f8').tobytes())
+            f.seek(columns_offset)
+            for block in blocks:
+                f.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return model_signature(path)
+
+
+def save_model(matcher, path=MODEL_BIN_PATH):
+    """
+    Guarda el modelo en formato binario de forma atómica (archivo temporal
+    y rename) con el bloqueo del modelo tomado: cabecera con versión y
+    parámetros LBPH, etiquetas int32, totales float64 y la matriz de
+    histogramas float32 (d, n)
+    Args:
+        matcher: LBPHMatcher a guardar
+        path: Ruta del archivo
+    Returns:
+        tuple: Firma (mtime_ns, tamaño, inodo) del archivo escrito
+    """
+    params = (matcher.radius, matcher.neighbors, matcher.grid_x, matcher.grid_y)
+    dimensions, count = matcher.columns.shape
+    # Por bloques de filas para no duplicar en memoria una matriz mapeada
+    blocks = (matcher.columns[start:stop] for start, stop in _row_blocks(dimensions, count))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with file_lock.exclusive(_lock_path(path)):
+        return _write_model(path, params, matcher.labels, matcher.totals, blocks)
+
+
+def update_model(matcher, histograms_by_label, path=MODEL_BIN_PATH):
+    """
+    Escribe un modelo nuevo donde las muestras de cada etiqueta de
+    `histograms_by_label` sustituyen a las del modelo actual. La lectura
+    y la escritura se hacen con el bloqueo del modelo tomado, partiendo
+    del archivo en disco, para no perder lo que otro proceso guardó
+    mientras tanto. Las columnas que se conservan se copian por bloques
+    de filas desde la matriz mapeada, sin materializarla, y el resultado
+    se vuelve a mapear desde el archivo.
+    Args:
+        matcher: LBPHMatcher con los parámetros de los histogramas; es el
+                 punto de partida solo si aún no existe el archivo
+        histograms_by_label: dict {etiqueta: histogramas (d,) de sus muestras}
+        path: Ruta del archivo
+    Returns:
+        tuple: (LBPHMatcher mapeado sobre el archivo nuevo, firma del archivo)
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with file_lock.exclusive(_lock_path(path)):
+        if os.path.exists(path):
+            current = load_model(path)
+            params = (current.radius, current.neighbors, current.grid_x, current.grid_y)
+            if params != (matcher.radius, matcher.neighbors, matcher.grid_x, matcher.grid_y):
+                raise Exception(f"Parámetros LBPH distintos a los del modelo guardado: {params}")
+            matcher = current
+
+        dimensions = matcher.columns.shape[0]
+        keep = np.flatnonzero(~np.isin(matcher.labels, list(histograms_by_label)))
+        new_labels = [np.full(len(h), label, dtype=np.int32)
+                      for label, h in histograms_by_label.items() if len(h)]
+        new_columns = [np.asarray(hist, dtype=np.float32).reshape(-1)
+                       for histograms in histograms_by_label.values() for hist in histograms]
+        new_columns = np.stack(new_columns, axis=1) if new_columns \
+            else np.zeros((dimensions, 0), dtype=np.float32)
+
+        labels = np.concatenate([matcher.labels[keep]] + new_labels)
+        totals = np.concatenate([matcher.totals[keep], new_columns.sum(axis=0, dtype=np.float64)])
+        blocks = (np.concatenate([matcher.columns[start:stop][:, keep], new_columns[start:stop]], axis=1)
+                  for start, stop in _row_blocks(dimensions, len(labels)))
+        params = (matcher.radius, matcher.neighbors, matcher.grid_x, matcher.grid_y)
+        signature = _write_model(path, params, labels, totals, blocks)
+        return load_model(path), signature
+
+
+def load_model(path=MODEL_BIN_PATH):
+    """
+    Carga un modelo binario mapeando los histogramas con numpy.memmap; no
+    se leen del disco hasta que se usan
+    Args:
+        path: Ruta del archivo
+    Returns:
+        LBPHMatcher: Comparador respaldado por el archivo
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER.size:
+        raise Exception(f"Modelo binario truncado: {path}")
+    magic, version, count, dimensions, radius, neighbors, grid_x, grid_y = HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise Exception(f"Formato de modelo desconocido: {path}")
+    if version != VERSION:
+        raise Exception(f"Versión de modelo no soportada: {version}")
+
+    labels_offset, totals_offset, columns_offset, end = _layout(count, dimensions)
+    if os.path.getsize(path) < end:
+        raise Exception(f"Modelo binario truncado: {path}")
+
+    if count == 0:
+        columns = np.zeros((dimensions, 0), dtype=np.float32)
+        labels = np.zeros(0, dtype=np.int32)
+        totals = np.zeros(0, dtype=np.float64)
+    else:
+        labels = np.fromfile(path, dtype='<i4', count=count, offset=labels_offset)
+        totals = np.fromfile(path, dtype='<f8', count=count, offset=totals_offset)
+        columns = np.memmap(path, dtype='<f4', mode='r', offset=columns_offset,
+                            shape=(dimensions, count))
+    return LBPHMatcher(columns, labels, radius=radius, neighbors=neighbors,
+                       grid_x=grid_x, grid_y=grid_y, totals=totals)
+
+
+def model_signature(path=MODEL_BIN_PATH):
+    """Identifica una versión concreta del archivo; None si no existe"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ModelWatcher:
+    """
+    Vigila el archivo del modelo binario y llama a `on_change(path)`
+    cuando un entrenamiento lo reemplaza, para recargarlo en caliente
+    """
+
+    def __init__(self, path, on_change, interval=1.0, signature=None):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.signature = signature if signature is not None else model_signature(path)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ModelWatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval * 2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            signature = model_signature(self.path)
+            if signature is None or signature == self.signature:
+                continue
+            self.signature = signature
+            try:
+                self.on_change(self.path)
+            except Exception as e:
+                print(f"Error recargando modelo: {str(e)}")
@@ -0,0 +1,143 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import re
+import time
+import settings
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+PREFIX = 'scrypt'
+
+# Formatos anteriores a scrypt que aún se aceptan al iniciar sesión y se
+# sustituyen por scrypt en cuanto el usuario entra: SHA-256 sin sal en
+# hexadecimal y texto plano. Un valor que empieza por '!' no corresponde
+# a ninguna contraseña (usuarios creados por bulk_faces).
+LEGACY_SHA256 = re.compile(r'[0-9a-fA-F]{64}')
+UNUSABLE_PREFIX = '!'
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _scrypt(password, salt, n, r, p):
+    # Margen sobre la memoria que necesita scrypt (128 * r * (n + p) bytes)
+    maxmem = 128 * r * (n + p) + (1 << 20)
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=maxmem, dklen=KEY_BYTES)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    """
+    Deriva una contraseña con scrypt y una sal aleatoria
+    Args:
+        password: Contraseña en texto plano
+        n, r, p: Parámetros de coste; por defecto los de settings
+    Returns:
+        str: 'scrypt$n$r$p$sal$hash' en base64
+    """
+    n = n or settings.PASSWORD_SCRYPT_N
+    r = r or settings.PASSWORD_SCRYPT_R
+    p = p or settings.PASSWORD_SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, n, r, p)
+    return f'{PREFIX}${n}${r}${p}${_b64(salt)}${_b64(key)}'
+
+
+def _parse(stored):
+    """Separa parámetros, sal y hash; None si el formato no es válido"""
+    try:
+        prefix, n, r, p, salt, key = stored.split('$')
+        if prefix != PREFIX:
+            return None
+        return int(n), int(r), int(p), base64.b64decode(salt), base64.b64decode(key)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _verify_legacy(password, stored):
+    """Comprueba una contraseña guardada en un formato anterior a scrypt"""
+    if not isinstance(stored, str) or not stored or stored.startswith(UNUSABLE_PREFIX):
+        return False
+    if LEGACY_SHA256.fullmatch(stored):
+        digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(digest, stored.lower())
+    return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+
+
+def verify_password(password, stored):
+    """
+    Comprueba una contraseña contra su derivación guardada en tiempo
+    constante. Los formatos anteriores (ver LEGACY_SHA256) también se
+    aceptan; needs_rehash() indica que deben pasarse a scrypt.
+    Returns:
+        bool: True si coincide
+    """
+    parsed = _parse(stored)
+    if parsed is None:
+        return _verify_legacy(password, stored)
+    n, r, p, salt, key = parsed
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), key)
+
+
+def needs_rehash(stored):
+    """Indica si la contraseña guardada no es scrypt con los parámetros configurados"""
+    parsed = _parse(stored)
+    if parsed is None:
+        return True
+    return parsed[:3] != (settings.PASSWORD_SCRYPT_N, settings.PASSWORD_SCRYPT_R,
+                          settings.PASSWORD_SCRYPT_P)
+
+
+# Derivación de relleno para que un usuario inexistente tarde lo mismo
+# que una contraseña incorrecta; se calcula la primera vez que se usa
+_dummy_hash = None
+
+
+def dummy_verify(password):
+    """Ejecuta una verificación completa que siempre falla"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password('')
+    verify_password(password, _dummy_hash)
+    return False
+
+
+def benchmark(costs=(2 ** 14, 2 ** 15, 2 ** 16, 2 ** 17), r=None, p=None, repeats=3):
+    """
+    Mide el tiempo y la memoria de una derivación para varios valores de N
+    Args:
+        costs: Valores de N a probar (potencias de dos)
+        r, p: Parámetros fijos; por defecto los de settings
+        repeats: Repeticiones por valor
+    Returns:
+        list: dicts con n, r, p, ms y mem_mb
+    """
+    r = r or settings.PASSWORD_SCRYPT_R
+    p = p or settings.PASSWORD_SCRYPT_P
+    salt = os.urandom(SALT_BYTES)
+    results = []
+    print(f"{'N':>8} {'r':>3} {'p':>3} {'ms':>9} {'MB':>7}")
+    for n in costs:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            _scrypt('benchmark', salt, n, r, p)
+        ms = (time.perf_counter() - start) * 1000.0 / repeats
+        mem_mb = 128 * r * n / (1024 * 1024)
+        results.append({'n': n, 'r': r, 'p': p, 'ms': ms, 'mem_mb': mem_mb})
+        print(f"{n:>8} {r:>3} {p:>3} {ms:>9.1f} {mem_mb:>7.1f}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calibra el coste de scrypt')
+    parser.add_argument('--costs', type=int, nargs='+', default=[2 ** 14, 2 ** 15, 2 ** 16, 2 ** 17],
+                        help='Valores de N a medir')
+    parser.add_argument('--r', type=int, default=None)
+    parser.add_argument('--p', type=int, default=None)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.costs, args.r, args.p, args.repeats)
@@ -0,0 +1,126 @@
+import threading
+import time
+from kivy.clock import Clock
+import metrics
+
+
+class RecognitionWorker:
+    """
+    Etapa de detección y reconocimiento que corre en un hilo de trabajo.
+
+    Solo existe un frame pendiente: si llega uno nuevo mientras el hilo
+    está ocupado, el anterior se descarta. Los resultados se entregan en
+    el hilo de la interfaz mediante Clock.schedule_once. Con una
+    RecognitionSession el worker deja de procesar frames en cuanto la
+    sesión toma una decisión.
+    """
+
+    def __init__(self, face_recognition, on_result, user_id=None, session=None):
+        """
+        Args:
+            face_recognition: Instancia de FaceRecognition
+            on_result: Callback que recibe el resultado en el hilo de UI
+            user_id: Si se indica, verificación 1:1 contra ese usuario
+            session: RecognitionSession opcional que acumula los resultados
+        """
+        self.face_recognition = face_recognition
+        self.on_result = on_result
+        self.user_id = user_id
+        self.session = session
+        self._condition = threading.Condition()
+        self._pending = None
+        self._running = False
+        self._thread = None
+
+        # Contadores
+        self.frames_submitted = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.last_duration = 0.0
+
+    def start(self):
+        """Inicia el hilo de trabajo"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='RecognitionWorker', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Detiene el hilo de trabajo y descarta el frame pendiente"""
+        with self._condition:
+            self._running = False
+            self._pending = None
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def set_session(self, session):
+        """Sustituye la sesión de decisión, por ejemplo para reintentar"""
+        with self._condition:
+            self.session = session
+            self._pending = None
+
+    @property
+    def decided(self):
+        """Indica si la sesión actual ya tomó una decisión"""
+        return self.session is not None and self.session.decided
+
+    def submit(self, seq, frame):
+        """
+        Envía un frame para reconocimiento sin bloquear
+        Args:
+            seq: Secuencia del frame
+            frame: Imagen BGR; el hilo no la modifica
+        """
+        with self._condition:
+            if self.decided:
+                return
+            if self._pending is not None:
+                self.frames_dropped += 1
+                metrics.count('worker_frames_dropped')
+            self._pending = (seq, frame)
+            self.frames_submitted += 1
+            self._condition.notify()
+
+    def _run(self):
+        """Bucle del hilo de trabajo"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                seq, frame = self._pending
+                self._pending = None
+                session = self.session
+
+            start = time.perf_counter()
+            try:
+                result = self.face_recognition.analyze_frame(frame, self.user_id)
+            except Exception as e:
+                print(f"Error en reconocimiento: {str(e)}")
+                continue
+            self.last_duration = time.perf_counter() - start
+            self.frames_processed += 1
+
+            result['sequence'] = seq
+            result['duration'] = self.last_duration
+            if session is not None:
+                result['decision'] = session.update(result)
+                result['session'] = session
+            Clock.schedule_once(lambda dt, result=result: self._deliver(result))
+
+    def _deliver(self, result):
+        """Entrega el resultado en el hilo de UI si el worker sigue activo"""
+        if self._running:
+            self.on_result(result)
+
+    def stats(self):
+        """Devuelve los contadores del worker"""
+        return {
+            'frames_submitted': self.frames_submitted,
+            'frames_processed': self.frames_processed,
+            'frames_dropped': self.frames_dropped,
+            'last_duration_ms': self.last_duration * 1000.0,
+        }
@@ -0,0 +1,138 @@
+import threading
+import time
+from kivy.clock import Clock
+from training import TrainingScheduler
+
+
+class RecognitionService:
+    """
+    Servicio de reconocimiento facial compartido por toda la aplicación.
+
+    Crea una sola instancia de FaceRecognition (clasificador, modelo y
+    cámara se cargan una vez), bajo demanda o precalentada en segundo
+    plano. Las pantallas se registran como consumidores con attach() y
+    detach(); cuando no queda ninguno el hilo de captura se pausa y la
+    cámara solo se libera si la pausa dura más de `release_delay` segundos.
+    También es dueño del TrainingScheduler, el único que escribe el modelo.
+    """
+
+    def __init__(self, release_delay=10.0):
+        self.release_delay = release_delay
+        self._face_recognition = None
+        self._lock = threading.Lock()
+        self._consumers = set()
+        self._release_event = None
+        self._warm_thread = None
+        self._training = None
+        self.warm_up_error = None
+        self.warm_up_seconds = None
+
+    @property
+    def ready(self):
+        """Indica si el servicio ya está inicializado"""
+        return self._face_recognition is not None
+
+    def get(self):
+        """
+        Obtiene la instancia compartida, creándola la primera vez
+        Returns:
+            FaceRecognition: Instancia compartida
+        """
+        with self._lock:
+            if self._face_recognition is None:
+                # OpenCV y el reconocimiento se importan la primera vez que
+                # se usan para no retrasar el arranque de la interfaz
+                from auth import FaceRecognition
+                self._face_recognition = FaceRecognition()
+                self._face_recognition.start_model_watcher()
+            return self._face_recognition
+
+    @property
+    def training(self):
+        """
+        Planificador de entrenamiento compartido, creado la primera vez
+        Returns:
+            TrainingScheduler: Planificador de la instancia compartida
+        """
+        face_recognition = self.get()
+        with self._lock:
+            if self._training is None:
+                self._training = TrainingScheduler(face_recognition)
+            return self._training
+
+    def warm_up(self, on_ready=None):
+        """
+        Inicializa el servicio en un hilo en segundo plano: importa OpenCV,
+        carga el clasificador y el modelo y abre la cámara
+        Args:
+            on_ready: Callback opcional (servicio) en el hilo de UI al terminar
+        """
+        if self._warm_thread is not None or self.ready:
+            return
+
+        def warm():
+            start = time.perf_counter()
+            try:
+                self.get()
+                self.warm_up_seconds = time.perf_counter() - start
+                print(f"Reconocimiento facial precargado en {self.warm_up_seconds:.2f} s")
+                if on_ready is not None:
+                    Clock.schedule_once(lambda dt: on_ready(self))
+            except Exception as e:
+                self.warm_up_error = e
+                print(f"Error precargando reconocimiento facial: {str(e)}")
+
+        self._warm_thread = threading.Thread(target=warm, name='RecognitionWarmUp', daemon=True)
+        self._warm_thread.start()
+
+    def attach(self, consumer):
+        """
+        Registra una pantalla como consumidora y reanuda la cámara
+        Args:
+            consumer: Objeto que usa el servicio (normalmente una Screen)
+        Returns:
+            FaceRecognition: Instancia compartida con el hilo de captura activo
+        """
+        if self._release_event is not None:
+            self._release_event.cancel()
+            self._release_event = None
+
+        face_recognition = self.get()
+        if not face_recognition.camera_open():
+            face_recognition.open_camera()
+        face_recognition.start_stream()
+        self._consumers.add(consumer)
+        return face_recognition
+
+    def detach(self, consumer):
+        """
+        Quita una pantalla consumidora. Sin consumidores el hilo de captura
+        se pausa y la cámara se libera tras `release_delay` segundos
+        """
+        self._consumers.discard(consumer)
+        if self._consumers or self._face_recognition is None:
+            return
+
+        self._face_recognition.stop_stream()
+        if self._release_event is not None:
+            self._release_event.cancel()
+        self._release_event = Clock.schedule_once(self._release_idle, self.release_delay)
+
+    def _release_idle(self, dt):
+        """Libera la cámara si nadie volvió a usarla durante la pausa"""
+        self._release_event = None
+        if not self._consumers and self._face_recognition is not None:
+            self._face_recognition.release_camera()
+
+    def shutdown(self):
+        """Libera todos los recursos al cerrar la aplicación"""
+        if self._release_event is not None:
+            self._release_event.cancel()
+            self._release_event = None
+        self._consumers.clear()
+        if self._training is not None:
+            self._training.stop()
+            self._training = None
+        if self._face_recognition is not None:
+            self._face_recognition.stop_model_watcher()
+            self._face_recognition.release_camera()
@@ -0,0 +1,114 @@
+import time
+import settings
+
+
+class RecognitionSession:
+    """
+    Decisión de reconocimiento acumulando evidencia de varios frames.
+
+    Cada predicción nueva del rostro seguido aporta una evidencia entre
+    -1 y 1 según lo lejos que quede su distancia del umbral. Para aceptar
+    la evidencia se suma mientras el usuario reconocido no cambie; para
+    rechazar se acumula la de la mejor distancia de cada frame sea cual
+    sea la etiqueta, de modo que un impostor cuyo vecino más cercano
+    alterna entre usuarios también se rechaza. La sesión se decide en
+    cuanto alcanza el límite de aceptación o de rechazo, o cuando se
+    agota el presupuesto de tiempo. Una vez decidida no hace falta seguir
+    detectando ni reconociendo.
+    """
+
+    ACCEPTED = 'accepted'
+    REJECTED = 'rejected'
+
+    def __init__(self, threshold=None, margin=None, accept_evidence=None,
+                 reject_evidence=None, min_frames=None, budget=None):
+        """
+        Args:
+            threshold: Distancia que separa evidencia a favor y en contra
+            margin: Distancia respecto al umbral que aporta evidencia máxima
+            accept_evidence: Evidencia acumulada para aceptar
+            reject_evidence: Evidencia acumulada en contra para rechazar
+            min_frames: Frames mínimos del mismo usuario antes de aceptar
+            budget: Segundos máximos desde el primer rostro hasta decidir
+        """
+        self.threshold = settings.RECOGNITION_THRESHOLD if threshold is None else threshold
+        self.margin = margin or settings.RECOGNITION_EVIDENCE_MARGIN
+        self.accept_evidence = accept_evidence or settings.RECOGNITION_ACCEPT_EVIDENCE
+        self.reject_evidence = reject_evidence or settings.RECOGNITION_REJECT_EVIDENCE
+        self.min_frames = min_frames or settings.RECOGNITION_MIN_FRAMES
+        self.budget = budget or settings.RECOGNITION_DECISION_BUDGET
+
+        self.label = None
+        self.evidence = 0.0
+        self.reject_score = 0.0
+        self.frames = 0
+        self.frames_total = 0
+        self.started_at = None
+        self.decision = None
+        self.reason = None
+        self.latency = None
+
+    @property
+    def decided(self):
+        return self.decision is not None
+
+    def _decide(self, decision, reason, now):
+        self.decision = decision
+        self.reason = reason
+        self.latency = now - self.started_at
+        return decision
+
+    def update(self, result, now=None):
+        """
+        Incorpora el resultado de analyze_frame
+        Args:
+            result: dict con 'faces' y 'predicted'
+            now: Instante del frame; por defecto time.monotonic()
+        Returns:
+            str or None: ACCEPTED, REJECTED o None si aún no hay decisión
+        """
+        if self.decided:
+            return self.decision
+        now = time.monotonic() if now is None else now
+
+        measured = [face for face in result['faces'] if face[5] is not None]
+        if self.started_at is None:
+            if not result['faces']:
+                return None
+            self.started_at = now
+
+        if result.get('predicted', True) and measured:
+            _, _, _, _, label, distance = min(measured, key=lambda face: face[5])
+            step = max(-1.0, min(1.0, (self.threshold - distance) / self.margin))
+            if label != self.label:
+                # Otro usuario: la evidencia para aceptar no se aplica
+                self.label = label
+                self.evidence = 0.0
+                self.frames = 0
+            self.evidence += step
+            self.frames += 1
+            self.frames_total += 1
+            # La evidencia en contra no depende de la etiqueta; un frame
+            # bueno la reduce pero no acumula crédito a favor
+            self.reject_score = min(0.0, self.reject_score + step)
+
+            if self.evidence >= self.accept_evidence and self.frames >= self.min_frames:
+                return self._decide(self.ACCEPTED, 'evidence', now)
+            if self.reject_score <= -self.reject_evidence:
+                return self._decide(self.REJECTED, 'evidence', now)
+
+        if now - self.started_at >= self.budget:
+            return self._decide(self.REJECTED, 'timeout', now)
+        return None
+
+    def stats(self):
+        """Devuelve el estado de la sesión"""
+        return {
+            'decision': self.decision,
+            'reason': self.reason,
+            'label': self.label,
+            'evidence': self.evidence,
+            'reject_score': self.reject_score,
+            'frames': self.frames_total,
+            'latency_ms': self.latency * 1000.0 if self.latency is not None else None,
+        }
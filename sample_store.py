@@ -0,0 +1,346 @@
+import contextlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import settings
+import file_lock
+
+# Tamaño fijo (ancho, alto) de las muestras en escala de grises
+FACE_SIZE = (100, 100)
+
+INDEX_DTYPE = np.dtype([
+    ('user_id', '<i4'),
+    ('offset', '<i8'),
+    ('timestamp', '<f8'),
+])
+
+# Etiqueta que marca en el índice las muestras eliminadas
+DELETED = -1
+
+
+def normalize_face(face):
+    """
+    Ajusta un recorte de rostro en escala de grises al tamaño fijo del almacén
+    Args:
+        face: Imagen en escala de grises
+    Returns:
+        numpy.ndarray: Imagen uint8 de tamaño FACE_SIZE
+    """
+    if face.shape[1] == FACE_SIZE[0] and face.shape[0] == FACE_SIZE[1]:
+        return face
+    interpolation = cv2.INTER_AREA if face.shape[1] > FACE_SIZE[0] else cv2.INTER_LINEAR
+    return cv2.resize(face, FACE_SIZE, interpolation=interpolation)
+
+
+def _decode_face(path):
+    """Decodifica y normaliza una imagen; None si no es legible"""
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    return normalize_face(img) if img is not None else None
+
+
+def sharpness(face):
+    """Varianza del laplaciano: valores bajos indican una imagen borrosa"""
+    return cv2.Laplacian(face, cv2.CV_64F).var()
+
+
+def difference_hash(face):
+    """Hash perceptual de 64 bits (dHash) de un rostro en escala de grises"""
+    small = cv2.resize(face, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+class SampleQualityGate:
+    """
+    Filtro de calidad de las muestras de registro: normaliza el recorte al
+    tamaño fijo, rechaza los borrosos y los casi idénticos a una muestra
+    ya aceptada
+    """
+
+    def __init__(self, min_sharpness=None, min_hash_distance=None):
+        self.min_sharpness = settings.ENROLLMENT_MIN_SHARPNESS if min_sharpness is None else min_sharpness
+        self.min_hash_distance = settings.ENROLLMENT_MIN_HASH_DISTANCE \
+            if min_hash_distance is None else min_hash_distance
+        self.hashes = []
+        self.rejected_blurry = 0
+        self.rejected_duplicate = 0
+
+    def check(self, face):
+        """
+        Args:
+            face: Recorte del rostro en escala de grises
+        Returns:
+            numpy.ndarray or None: Recorte normalizado si se acepta
+        """
+        face = normalize_face(face)
+        if sharpness(face) < self.min_sharpness:
+            self.rejected_blurry += 1
+            return None
+
+        face_hash = difference_hash(face)
+        if any(bin(face_hash ^ h).count('1') < self.min_hash_distance for h in self.hashes):
+            self.rejected_duplicate += 1
+            return None
+
+        self.hashes.append(face_hash)
+        return face
+
+
+class SampleStore:
+    """
+    Almacén empaquetado de muestras faciales.
+
+    Todas las muestras viven en un único archivo binario de recortes de
+    tamaño fijo, legible con numpy.memmap sin decodificar imágenes, y en
+    un índice paralelo con (user_id, offset, timestamp). Ambos archivos
+    solo se amplían al final. Las escrituras toman un bloqueo exclusivo de
+    archivo, así que varias instancias o procesos (la aplicación, el
+    entrenamiento, bulk_faces) pueden escribir en el mismo almacén.
+    """
+
+    def __init__(self, root='data'):
+        self.root = root
+        self.data_path = os.path.join(root, 'samples.u8')
+        self.index_path = os.path.join(root, 'samples.idx')
+        self.lock_path = os.path.join(root, 'samples.lock')
+        self.migration_path = os.path.join(root, 'migration.json')
+        self.sample_bytes = FACE_SIZE[0] * FACE_SIZE[1]
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Bloqueo exclusivo entre hilos de esta instancia y entre procesos"""
+        with self._lock, file_lock.exclusive(self.lock_path):
+            yield
+
+    def __len__(self):
+        return len(self.index())
+
+    def index(self):
+        """
+        Lee el índice de muestras
+        Returns:
+            numpy.ndarray: Registros con user_id, offset y timestamp
+        """
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+
+        index = np.fromfile(self.index_path, dtype=INDEX_DTYPE)
+        # Ignorar registros cuyo recorte no terminó de escribirse
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        return index[index['offset'] + self.sample_bytes <= data_size]
+
+    def append(self, user_id, faces, timestamp=None):
+        """
+        Agrega muestras de un usuario al final del almacén
+        Args:
+            user_id: ID del usuario
+            faces: Recortes en escala de grises (se normalizan a FACE_SIZE)
+            timestamp: Marca de tiempo; por defecto la actual
+        Returns:
+            int: Número de muestras agregadas
+        """
+        if len(faces) == 0:
+            return 0
+
+        block = np.stack([normalize_face(face) for face in faces]).astype(np.uint8, copy=False)
+        timestamp = time.time() if timestamp is None else timestamp
+
+        data = block.tobytes()
+        with self._exclusive():
+            with open(self.data_path, 'ab') as data_file:
+                data_file.write(data)
+                data_file.flush()
+                # El desplazamiento se toma después de escribir y con el
+                # bloqueo tomado: es el final real del archivo
+                start = data_file.tell() - len(data)
+
+            records = np.zeros(len(block), dtype=INDEX_DTYPE)
+            records['user_id'] = user_id
+            records['offset'] = start + np.arange(len(block), dtype=np.int64) * self.sample_bytes
+            records['timestamp'] = timestamp
+            # El índice se escribe después de los datos: un corte a mitad
+            # de escritura deja como mucho datos huérfanos, nunca índices rotos
+            with open(self.index_path, 'ab') as index_file:
+                index_file.write(records.tobytes())
+        return len(block)
+
+    def delete_user(self, user_id, before=None, timestamp=None):
+        """
+        Marca como eliminadas las muestras de un usuario
+        Args:
+            user_id: ID del usuario
+            before: Solo las anteriores a esta marca de tiempo
+            timestamp: Solo las de esta marca de tiempo exacta (una sesión)
+        Returns:
+            int: Número de muestras marcadas
+        """
+        with self._exclusive():
+            if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == 0:
+                return 0
+            index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode='r+')
+            mask = index['user_id'] == user_id
+            if before is not None:
+                mask &= index['timestamp'] < before
+            if timestamp is not None:
+                mask &= index['timestamp'] == timestamp
+            count = int(mask.sum())
+            if count:
+                index['user_id'][mask] = DELETED
+                index.flush()
+            del index
+            return count
+
+    def replace_user(self, user_id, faces):
+        """Sustituye las muestras de un usuario por las nuevas"""
+        self.delete_user(user_id)
+        return self.append(user_id, faces)
+
+    def _crops(self):
+        """Proyecta el archivo de datos como matriz (n, alto, ancho) sin copiar"""
+        if not os.path.exists(self.data_path):
+            return np.zeros((0, FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+        count = os.path.getsize(self.data_path) // self.sample_bytes
+        if count == 0:
+            return np.zeros((0, FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+        return np.memmap(self.data_path, dtype=np.uint8, mode='r',
+                         shape=(count, FACE_SIZE[1], FACE_SIZE[0]))
+
+    def samples(self, user_ids=None):
+        """
+        Obtiene muestras y etiquetas
+        Args:
+            user_ids: ID o colección de IDs a incluir; None para todos
+        Returns:
+            tuple: (lista de recortes, numpy.ndarray de etiquetas int32)
+        """
+        index = self.index()
+        index = index[index['user_id'] != DELETED]
+        if user_ids is not None:
+            if np.isscalar(user_ids):
+                user_ids = [user_ids]
+            index = index[np.isin(index['user_id'], list(user_ids))]
+
+        crops = self._crops()
+        rows = index['offset'] // self.sample_bytes
+        faces = [crops[row] for row in rows]
+        return faces, index['user_id'].astype(np.int32)
+
+    def user_ids(self):
+        """Devuelve los IDs de usuario con muestras activas"""
+        labels = self.index()['user_id']
+        return sorted(int(label) for label in np.unique(labels[labels != DELETED]))
+
+    def latest_timestamps(self):
+        """
+        Returns:
+            dict: {user_id: marca de tiempo de su muestra activa más reciente}
+        """
+        index = self.index()
+        index = index[index['user_id'] != DELETED]
+        latest = {}
+        for user_id, timestamp in zip(index['user_id'].tolist(), index['timestamp'].tolist()):
+            if timestamp > latest.get(user_id, float('-inf')):
+                latest[user_id] = timestamp
+        return latest
+
+    def _read_migration_cache(self):
+        try:
+            with open(self.migration_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_migration_cache(self, cache):
+        """Escribe la caché de migración de forma atómica"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='migration.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.migration_path)
+
+    def migrate_from_directories(self, root=None, workers=None):
+        """
+        Importa las carpetas del formato anterior data/user_{id}/N.jpg.
+        Una caché guarda (ruta, st_mtime_ns, st_size) de cada archivo
+        importado y una carpeta solo se vuelve a decodificar si alguno de
+        sus archivos se agregó, se quitó o se sobrescribió; entonces sus
+        muestras sustituyen a las del usuario. Una carpeta que aún no está
+        en la caché se ignora si es anterior a la muestra más reciente del
+        usuario (se registró de nuevo con la cámara). Las imágenes se
+        decodifican y normalizan en un pool de hilos (cv2 libera el GIL).
+        Args:
+            root: Directorio con las carpetas user_{id}; por defecto el del almacén
+            workers: Hilos de decodificación; por defecto los de ThreadPoolExecutor
+        Returns:
+            int: Número de muestras importadas
+        """
+        root = root or self.root
+        if not os.path.isdir(root):
+            return 0
+
+        cache = self._read_migration_cache()
+        cached = len(cache)
+        latest = self.latest_timestamps()
+        pending = []
+        skipped = 0
+        for entry in sorted(os.listdir(root)):
+            match = re.fullmatch(r'user_(\d+)', entry)
+            user_dir = os.path.join(root, entry)
+            if not match or not os.path.isdir(user_dir):
+                continue
+            user_id = int(match.group(1))
+            files = {}
+            for name in sorted(os.listdir(user_dir)):
+                st = os.stat(os.path.join(user_dir, name))
+                files[name] = [st.st_mtime_ns, st.st_size]
+            key = os.path.abspath(user_dir)
+            if key not in cache and user_id in latest and \
+                    max((mtime for mtime, _ in files.values()), default=0) / 1e9 <= latest[user_id]:
+                cache[key] = files
+                skipped += 1
+                continue
+            if cache.get(key) == files:
+                skipped += 1
+                continue
+            pending.append((user_id, key, files))
+
+        if not pending:
+            if len(cache) != cached:
+                self._write_migration_cache(cache)
+            return 0
+
+        start = time.perf_counter()
+        all_paths = [os.path.join(key, name) for _, key, files in pending for name in files]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            decoded = list(pool.map(_decode_face, all_paths))
+        decode_seconds = time.perf_counter() - start
+
+        imported = 0
+        position = 0
+        for user_id, key, files in pending:
+            faces = [face for face in decoded[position:position + len(files)] if face is not None]
+            position += len(files)
+            self.delete_user(user_id)
+            mtime = max((mtime for mtime, _ in files.values()), default=0) / 1e9
+            imported += self.append(user_id, faces, mtime)
+            cache[key] = files
+        self._write_migration_cache(cache)
+
+        elapsed = time.perf_counter() - start
+        rate = len(all_paths) / decode_seconds if decode_seconds > 0 else 0.0
+        print(f"Migradas {imported} muestras de {len(pending)} usuarios al almacén {self.data_path} "
+              f"en {elapsed:.2f} s ({rate:.0f} imágenes/s; {skipped} usuarios sin cambios)")
+        return imported
+
+if __name__ == '__main__':
+    SampleStore().migrate_from_directories()
@@ -0,0 +1,103 @@
+"""
+Configuración compartida de la aplicación. Cada valor se puede
+sobrescribir con la variable de entorno del mismo nombre.
+"""
+import os
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    if cast is bool:
+        return value.strip().lower() in ('1', 'true', 'yes', 'si', 'sí')
+    return cast(value)
+
+
+# Detección de rostros (compartida por reconocimiento y registro)
+DETECTION_SCALE_FACTOR = _env('DETECTION_SCALE_FACTOR', 1.1, float)
+DETECTION_ENROLLMENT_SCALE_FACTOR = _env('DETECTION_ENROLLMENT_SCALE_FACTOR', 1.3, float)
+DETECTION_MIN_NEIGHBORS = _env('DETECTION_MIN_NEIGHBORS', 5, int)
+# Tamaño mínimo del rostro en píxeles de la resolución completa
+DETECTION_MIN_SIZE = _env('DETECTION_MIN_SIZE', 30, int)
+# Escala de la copia reducida sobre la que se detecta (1.0, 0.5, 0.25...)
+DETECTION_DOWNSCALE = _env('DETECTION_DOWNSCALE', 0.5, float)
+# Elegir la escala según el tamaño del último rostro (solo en el flujo de la cámara)
+DETECTION_ADAPTIVE = _env('DETECTION_ADAPTIVE', True, bool)
+# Ancho que debe conservar el rostro en la copia reducida (modo adaptativo)
+DETECTION_ADAPTIVE_FACE_SIZE = _env('DETECTION_ADAPTIVE_FACE_SIZE', 64, int)
+DETECTION_MIN_DOWNSCALE = _env('DETECTION_MIN_DOWNSCALE', 0.25, float)
+
+# Backend de detección: 'haar', 'lbp' o 'yunet' (si no está disponible se usa 'haar')
+DETECTOR_BACKEND = _env('DETECTOR_BACKEND', 'haar')
+DETECTOR_LBP_CASCADE = _env('DETECTOR_LBP_CASCADE', 'models/lbpcascade_frontalface_improved.xml')
+DETECTOR_YUNET_MODEL = _env('DETECTOR_YUNET_MODEL', 'models/face_detection_yunet_2023mar.onnx')
+DETECTOR_YUNET_SCORE = _env('DETECTOR_YUNET_SCORE', 0.8, float)
+
+# Cámara
+# Índice fijo del dispositivo; vacío para probar 0..CAMERA_MAX_INDEX-1
+CAMERA_INDEX = _env('CAMERA_INDEX', None, int)
+CAMERA_MAX_INDEX = _env('CAMERA_MAX_INDEX', 3, int)
+# Backend de captura: 'any', 'v4l2', 'dshow', 'msmf' o 'avfoundation'
+CAMERA_BACKEND = _env('CAMERA_BACKEND', 'any')
+CAMERA_WIDTH = _env('CAMERA_WIDTH', 640, int)
+CAMERA_HEIGHT = _env('CAMERA_HEIGHT', 480, int)
+CAMERA_FPS = _env('CAMERA_FPS', 30, int)
+# FourCC del formato de captura (MJPG reduce ancho de banda USB); vacío para no cambiarlo
+CAMERA_FOURCC = _env('CAMERA_FOURCC', 'MJPG')
+# Frames que retiene el driver; 1 minimiza la latencia
+CAMERA_BUFFER_SIZE = _env('CAMERA_BUFFER_SIZE', 1, int)
+# Último dispositivo que funcionó, se prueba primero
+CAMERA_CACHE_PATH = _env('CAMERA_CACHE_PATH', 'models/camera.json')
+
+# Captura de muestras de registro
+ENROLLMENT_SAMPLES = _env('ENROLLMENT_SAMPLES', 5, int)
+ENROLLMENT_TIMEOUT = _env('ENROLLMENT_TIMEOUT', 30.0, float)
+# Frames seguidos sin rostro antes de abortar la captura
+ENROLLMENT_MAX_NO_FACE_FRAMES = _env('ENROLLMENT_MAX_NO_FACE_FRAMES', 150, int)
+# Varianza mínima del laplaciano para aceptar una muestra (rechaza las borrosas)
+ENROLLMENT_MIN_SHARPNESS = _env('ENROLLMENT_MIN_SHARPNESS', 50.0, float)
+# Distancia de Hamming mínima (de 64 bits) entre hashes de muestras aceptadas
+ENROLLMENT_MIN_HASH_DISTANCE = _env('ENROLLMENT_MIN_HASH_DISTANCE', 5, int)
+
+# Entrenamiento
+# Segundos que espera el planificador para agrupar registros seguidos en una pasada
+TRAINING_DEBOUNCE = _env('TRAINING_DEBOUNCE', 0.5, float)
+
+# Usuarios
+USERS_DB_PATH = _env('USERS_DB_PATH', 'models/users.db')
+
+# Contraseñas (scrypt). Calibrar con: python passwords.py
+PASSWORD_SCRYPT_N = _env('PASSWORD_SCRYPT_N', 2 ** 15, int)
+PASSWORD_SCRYPT_R = _env('PASSWORD_SCRYPT_R', 8, int)
+PASSWORD_SCRYPT_P = _env('PASSWORD_SCRYPT_P', 1, int)
+# Derivaciones simultáneas como máximo (cada una usa 128 * N * R bytes)
+PASSWORD_MAX_CONCURRENCY = _env('PASSWORD_MAX_CONCURRENCY', 2, int)
+
+# Decisión de reconocimiento por varios frames
+# Distancia LBPH por debajo de la cual un frame aporta evidencia a favor
+RECOGNITION_THRESHOLD = _env('RECOGNITION_THRESHOLD', 85.0, float)
+# Distancia a la que un frame aporta la evidencia máxima (1) a favor o en contra
+RECOGNITION_EVIDENCE_MARGIN = _env('RECOGNITION_EVIDENCE_MARGIN', 15.0, float)
+# Evidencia acumulada para aceptar y para rechazar
+RECOGNITION_ACCEPT_EVIDENCE = _env('RECOGNITION_ACCEPT_EVIDENCE', 3.0, float)
+RECOGNITION_REJECT_EVIDENCE = _env('RECOGNITION_REJECT_EVIDENCE', 4.0, float)
+# Frames mínimos del mismo usuario antes de aceptar
+RECOGNITION_MIN_FRAMES = _env('RECOGNITION_MIN_FRAMES', 2, int)
+# Segundos máximos desde el primer rostro hasta la decisión
+RECOGNITION_DECISION_BUDGET = _env('RECOGNITION_DECISION_BUDGET', 5.0, float)
+
+# Métricas de rendimiento por etapa
+METRICS_ENABLED = _env('METRICS_ENABLED', False, bool)
+# Mediciones que conserva cada etapa para calcular los percentiles
+METRICS_WINDOW = _env('METRICS_WINDOW', 512, int)
+# Mostrar las métricas sobre la vista de la cámara
+METRICS_OVERLAY = _env('METRICS_OVERLAY', False, bool)
+# Archivo JSON lines donde volcar las métricas periódicamente; vacío para no volcarlas
+METRICS_EXPORT_PATH = _env('METRICS_EXPORT_PATH', '')
+METRICS_EXPORT_INTERVAL = _env('METRICS_EXPORT_INTERVAL', 5.0, float)
+
+# Arranque
+# Mostrar primero el login y cargar OpenCV, modelo y cámara en segundo plano;
+# las pantallas de cámara se construyen al abrirlas por primera vez
+STARTUP_DEFERRED = _env('STARTUP_DEFERRED', True, bool)
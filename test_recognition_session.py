@@ -0,0 +1,41 @@
+from recognition_session import RecognitionSession
+
+
+def _result(label, distance):
+    return {'faces': [(0, 0, 100, 100, label, distance)], 'predicted': True}
+
+
+def _session():
+    return RecognitionSession(threshold=85.0, margin=15.0, accept_evidence=3.0,
+                              reject_evidence=4.0, min_frames=2, budget=5.0)
+
+
+def test_alternating_labels_above_threshold_reject_before_budget():
+    session = _session()
+    decision = None
+    for frame in range(20):
+        decision = session.update(_result(1 + frame % 2, 110.0), now=frame * 0.1)
+        if decision is not None:
+            break
+    assert decision == RecognitionSession.REJECTED
+    assert session.reason == 'evidence'
+    assert session.latency < session.budget
+
+
+def test_same_label_below_threshold_accepts():
+    session = _session()
+    decision = None
+    for frame in range(10):
+        decision = session.update(_result(7, 60.0), now=frame * 0.1)
+        if decision is not None:
+            break
+    assert decision == RecognitionSession.ACCEPTED
+    assert session.label == 7
+
+
+def test_good_frames_do_not_bank_credit_against_rejection():
+    session = _session()
+    for frame in range(5):
+        session.update(_result(frame % 2, 60.0), now=frame * 0.1)
+    assert session.reject_score == 0.0
+    assert not session.decided
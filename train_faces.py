@@ -1,60 +1,54 @@
-import os
+import time
 import cv2
 import numpy as np
-import sqlite3
+from sample_store import SampleStore
+from user_repository import UserRepository
+from lbph_matcher import LBPHMatcher
+import model_store
 
 def train_model():
     print("Iniciando entrenamiento del modelo...")
     
-    faces = []
-    labels = []
-    label_map = {}
-    
     try:
-        conn = sqlite3.connect('models/users.db')
-        cursor = conn.cursor()
-        
         # Obtener usuarios registrados
-        cursor.execute('SELECT id FROM users')
-        user_ids = [row[0] for row in cursor.fetchall()]
+        users = UserRepository()
+        user_ids = users.user_ids()
+        
+        # Importar las carpetas data/user_* del formato anterior; solo se
+        # decodifican las que cambiaron desde la última importación
+        start = time.perf_counter()
+        store = SampleStore('data')
+        store.migrate_from_directories()
         
-        for user_id in user_ids:
-            user_dir = f'data/user_{user_id}'
-            if not os.path.exists(user_dir):
-                continue
-                
-            for img_name in os.listdir(user_dir):
-                img_path = os.path.join(user_dir, img_name)
-                try:
-                    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                    if img is not None:
-                        faces.append(img)
-                        labels.append(user_id)
-                        print(f"Procesada: {img_path}")
-                except Exception as e:
-                    print(f"Error procesando {img_path}: {str(e)}")
+        # Las muestras se leen del almacén mapeado en memoria, sin decodificar
+        faces, labels = store.samples(user_ids)
+        load_seconds = time.perf_counter() - start
         
         if len(faces) == 0:
             print("Error: No se encontraron imágenes para entrenar")
             return False
         
         # Entrenar el modelo
+        start = time.perf_counter()
         recognizer = cv2.face.LBPHFaceRecognizer_create()
         recognizer.train(faces, np.array(labels))
+        train_seconds = time.perf_counter() - start
         
-        # Guardar el modelo
-        os.makedirs("models", exist_ok=True)
-        recognizer.save("models/recognizer.yml")
+        # Guardar el modelo binario mapeable que recargan en caliente las
+        # instancias de FaceRecognition en ejecución
+        model_store.save_model(LBPHMatcher.from_recognizer(recognizer))
         
-        print(f"Modelo entrenado con {len(faces)} imágenes de {len(set(labels))} usuarios")
+        print(f"Modelo entrenado con {len(faces)} imágenes de {len(set(labels))} usuarios: "
+              f"carga {load_seconds:.2f} s ({len(faces) / max(load_seconds, 1e-9):.0f} imágenes/s), "
+              f"entrenamiento {train_seconds:.2f} s ({len(faces) / max(train_seconds, 1e-9):.0f} imágenes/s)")
         return True
         
     except Exception as e:
         print(f"Error durante el entrenamiento: {str(e)}")
         return False
     finally:
-        if 'conn' in locals():
-            conn.close()
+        if 'users' in locals():
+            users.close()
 
 if __name__ == '__main__':
     train_model()
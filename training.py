@@ -0,0 +1,207 @@
+import threading
+import time
+from kivy.clock import Clock
+import settings
+
+
+class TrainingJob:
+    """
+    Pasada de entrenamiento pendiente o en curso. Agrupa los registros
+    que llegan antes de que empiece y avisa a los suscriptores al terminar.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+
+    def __init__(self, compact=False):
+        self.user_ids = []
+        self.compact = compact
+        self.state = self.PENDING
+        self.progress = (0, 0)
+        self.success = None
+        self.enrolled = []
+        self.duration = None
+        self.submitted_at = time.monotonic()
+        self._callbacks = []
+        self._progress_callbacks = []
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def subscribe(self, on_done=None, on_progress=None):
+        """
+        Registra callbacks en el hilo de UI
+        Args:
+            on_done: Callback (job) al terminar; inmediato si ya terminó
+            on_progress: Callback (procesados, total)
+        """
+        with self._lock:
+            if on_progress is not None:
+                self._progress_callbacks.append(on_progress)
+            if on_done is not None and not self._done.is_set():
+                self._callbacks.append(on_done)
+                return
+        if on_done is not None:
+            Clock.schedule_once(lambda dt: on_done(self))
+
+    def succeeded_for(self, user_id):
+        """Indica si el usuario quedó incluido en el modelo"""
+        return bool(self.success) and (self.compact or user_id in self.enrolled)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _report_progress(self, done, total):
+        self.progress = (done, total)
+        with self._lock:
+            callbacks = list(self._progress_callbacks)
+        for callback in callbacks:
+            Clock.schedule_once(lambda dt, cb=callback: cb(done, total))
+
+    def _finish(self, success, enrolled, duration):
+        with self._lock:
+            self.success = success
+            self.enrolled = enrolled
+            self.duration = duration
+            self.state = self.DONE
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            Clock.schedule_once(lambda dt, cb=callback: cb(self))
+
+
+class TrainingScheduler:
+    """
+    Único escritor del modelo dentro de la aplicación.
+
+    Un solo hilo atiende una cola de trabajos. Los registros que llegan
+    mientras hay un trabajo pendiente (aún no iniciado) se agregan a él,
+    de modo que varios registros seguidos se resuelven en una sola
+    pasada y una sola escritura del modelo binario.
+    """
+
+    def __init__(self, face_recognition, debounce=None):
+        """
+        Args:
+            face_recognition: Instancia de FaceRecognition que se actualiza
+            debounce: Segundos de espera para agrupar registros
+        """
+        self.face_recognition = face_recognition
+        self.debounce = settings.TRAINING_DEBOUNCE if debounce is None else debounce
+        self._condition = threading.Condition()
+        self._queue = []
+        self._current = None
+        self._running = True
+        self.jobs_completed = 0
+        self.last_duration = None
+        self._thread = threading.Thread(target=self._run, name='TrainingScheduler', daemon=True)
+        self._thread.start()
+
+    def _pending(self, compact):
+        """Último trabajo sin iniciar del mismo tipo (requiere el lock)"""
+        for job in reversed(self._queue):
+            if job.compact == compact:
+                return job
+        return None
+
+    def submit(self, user_id):
+        """
+        Encola el registro incremental de un usuario
+        Args:
+            user_id: ID del usuario con muestras nuevas
+        Returns:
+            TrainingJob: Trabajo que lo incluye
+        """
+        with self._condition:
+            if not self._running:
+                raise Exception("El planificador de entrenamiento está detenido")
+            job = self._pending(compact=False)
+            if job is None:
+                job = TrainingJob()
+                self._queue.append(job)
+            if user_id not in job.user_ids:
+                job.user_ids.append(user_id)
+            job.submitted_at = time.monotonic()
+            self._condition.notify_all()
+            return job
+
+    def submit_compact(self):
+        """
+        Encola un reentrenamiento completo desde las muestras en disco
+        Returns:
+            TrainingJob: Trabajo de compactación
+        """
+        with self._condition:
+            if not self._running:
+                raise Exception("El planificador de entrenamiento está detenido")
+            job = self._pending(compact=True)
+            if job is None:
+                job = TrainingJob(compact=True)
+                self._queue.append(job)
+            self._condition.notify_all()
+            return job
+
+    @property
+    def busy(self):
+        return self._current is not None or bool(self._queue)
+
+    def _next_job(self):
+        """Espera el siguiente trabajo respetando la ventana de agrupación"""
+        with self._condition:
+            while self._running:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                job = self._queue[0]
+                remaining = job.submitted_at + self.debounce - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                self._queue.pop(0)
+                job.state = TrainingJob.RUNNING
+                self._current = job
+                return job
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            started = time.perf_counter()
+            try:
+                if job.compact:
+                    job._report_progress(0, 1)
+                    success = self.face_recognition.compact_model()
+                    enrolled = []
+                    job._report_progress(1, 1)
+                else:
+                    enrolled = self.face_recognition.enroll_users(
+                        job.user_ids, on_progress=job._report_progress)
+                    success = bool(enrolled)
+            except Exception as e:
+                print(f"Error en entrenamiento: {str(e)}")
+                success, enrolled = False, []
+
+            duration = time.perf_counter() - started
+            self.last_duration = duration
+            self.jobs_completed += 1
+            kind = "Compactación" if job.compact else f"Entrenamiento de {len(enrolled)} usuario(s)"
+            print(f"{kind} {'completado' if success else 'fallido'} en {duration:.2f} s")
+            with self._condition:
+                self._current = None
+            job._finish(success, enrolled, duration)
+
+    def stop(self, timeout=5.0):
+        """
+        Deja de aceptar trabajos y espera al que está en curso. Los
+        pendientes terminan como fallidos para que sus suscriptores se enteren
+        """
+        with self._condition:
+            self._running = False
+            cancelled, self._queue = self._queue, []
+            self._condition.notify_all()
+        for job in cancelled:
+            job._finish(False, [], 0.0)
+        self._thread.join(timeout)
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import settings
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    face_id INTEGER
+)
+'''
+# Columnas que deben tener índice; username ya lo tiene por UNIQUE en las
+# tablas creadas aquí, pero una base de datos anterior puede no tenerlo
+INDEXED_COLUMNS = ('username', 'face_id')
+
+# Consultas con parámetros: sqlite3 las prepara una vez y las reutiliza
+# desde la caché de sentencias de la conexión
+SELECT_BY_USERNAME = 'SELECT id, username, password, face_id FROM users WHERE username=?'
+SELECT_BY_FACE_ID = 'SELECT id, username, password, face_id FROM users WHERE face_id=?'
+SELECT_FACE_USERS = 'SELECT id, username, password, face_id FROM users WHERE face_id IS NOT NULL'
+SELECT_IDS = 'SELECT id FROM users'
+INSERT_USER = 'INSERT INTO users (username, password) VALUES (?, ?)'
+UPDATE_FACE_ID = 'UPDATE users SET face_id=? WHERE id=?'
+UPDATE_PASSWORD = 'UPDATE users SET password=? WHERE id=?'
+
+
+def _user(row):
+    """Convierte una fila en dict; None si no hay fila"""
+    if row is None:
+        return None
+    return {'id': row[0], 'username': row[1], 'password': row[2], 'face_id': row[3]}
+
+
+class UserRepository:
+    """
+    Acceso compartido a la base de datos de usuarios.
+
+    Mantiene una sola conexión SQLite en modo WAL, protegida por un lock
+    para poder usarse desde los hilos de trabajo, y un mapa en memoria
+    face_id -> usuario que evita ir a disco al reconocer un rostro. El
+    mapa se invalida cuando cambia el face_id de algún usuario.
+    """
+
+    def __init__(self, path=None, cached_statements=32):
+        """
+        Args:
+            path: Ruta de la base de datos; por defecto settings.USERS_DB_PATH
+            cached_statements: Tamaño de la caché de sentencias preparadas
+        """
+        self.path = path or settings.USERS_DB_PATH
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False,
+                                    cached_statements=cached_statements)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(SCHEMA)
+        self._ensure_indexes()
+        self.conn.commit()
+        self._face_users = None
+
+    def _ensure_indexes(self):
+        """
+        Crea un índice por columna de INDEXED_COLUMNS solo si ninguno la
+        cubre, y quita el propio si otro índice ya la cubre
+        """
+        covering = {}
+        for index in self.conn.execute('PRAGMA index_list(users)').fetchall():
+            columns = self.conn.execute(f'PRAGMA index_info("{index[1]}")').fetchall()
+            if columns:
+                covering.setdefault(columns[0][2], []).append(index[1])
+        for column in INDEXED_COLUMNS:
+            own = f'idx_users_{column}'
+            indexes = covering.get(column, [])
+            if not indexes:
+                self.conn.execute(f'CREATE INDEX {own} ON users({column})')
+            elif own in indexes and len(indexes) > 1:
+                self.conn.execute(f'DROP INDEX {own}')
+
+    def _fetchone(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def _write(self, sql, params):
+        with self._lock:
+            cursor = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cursor
+
+    def get_by_username(self, username):
+        """
+        Args:
+            username: Nombre de usuario
+        Returns:
+            dict or None: Usuario con id, username, password y face_id
+        """
+        return _user(self._fetchone(SELECT_BY_USERNAME, (username,)))
+
+    def get_user_id(self, username):
+        """Devuelve el ID de un usuario o None si no existe"""
+        user = self.get_by_username(username)
+        return user['id'] if user else None
+
+    def user_ids(self):
+        """Devuelve los IDs de todos los usuarios"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute(SELECT_IDS).fetchall()]
+
+    def _face_map(self):
+        """Mapa face_id -> usuario, cargado de una vez tras cada invalidación"""
+        with self._lock:
+            if self._face_users is None:
+                rows = self.conn.execute(SELECT_FACE_USERS).fetchall()
+                self._face_users = {row[3]: _user(row) for row in rows}
+            return self._face_users
+
+    def get_by_face_id(self, face_id):
+        """
+        Resuelve el usuario de un rostro reconocido desde memoria. Si no
+        está en el mapa se consulta la base de datos y se agrega: otro
+        proceso (bulk_faces) puede haber registrado rostros con su propia
+        conexión
+        Args:
+            face_id: Etiqueta devuelta por el reconocedor
+        Returns:
+            dict or None: Usuario con ese face_id
+        """
+        with self._lock:
+            face_users = self._face_map()
+            user = face_users.get(face_id)
+            if user is None:
+                user = _user(self.conn.execute(SELECT_BY_FACE_ID, (face_id,)).fetchone())
+                if user is not None:
+                    face_users[face_id] = user
+            return user
+
+    def create_user(self, username, password_hash):
+        """
+        Crea un usuario
+        Args:
+            username: Nombre de usuario
+            password_hash: Contraseña ya derivada
+        Returns:
+            int or None: ID del usuario, o None si el nombre ya existe
+        """
+        try:
+            return self._write(INSERT_USER, (username, password_hash)).lastrowid
+        except sqlite3.IntegrityError:
+            return None
+
+    def set_password(self, user_id, password_hash):
+        """Sustituye la contraseña derivada de un usuario"""
+        self._write(UPDATE_PASSWORD, (password_hash, user_id))
+
+    def set_face_id(self, user_id, face_id):
+        """Asocia un rostro registrado a un usuario e invalida el mapa en memoria"""
+        with self._lock:
+            self._write(UPDATE_FACE_ID, (face_id, user_id))
+            self._face_users = None
+
+    def invalidate(self):
+        """Descarta el mapa face_id -> usuario"""
+        with self._lock:
+            self._face_users = None
+
+    def close(self):
+        with self._lock:
+            self.conn.close()